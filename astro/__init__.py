@@ -1,8 +1,32 @@
 ''' This package is about holding and calculating information via `skyfield` from
     my location in Columbus, Ohio.
+
+    `home` and `timezone` are only built when first used, so that importing
+    the package, and starting the command line tools, stays quick.
 '''
-from skyfield.api import earth
-import pytz
+import os
+from collections import namedtuple
+
+LATITUDE = 39.995
+LONGITUDE = -83.004
+ELEVATION = 250  # meters
+
+# Everything worked out once and kept between runs goes under here.
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'astro')
+
+# Where something is in the sky from home, in degrees.
+Position = namedtuple('Position', 'name alt azi symbol')
+
 
-home = earth.topos('39.995 N', '83.004 W', elevation_m=250)
-timezone = pytz.timezone('US/Eastern')
+def __getattr__(name):
+    if name == 'home':
+        from .ephemeris import load
+        value = load()['earth'].topos(latitude_degrees=LATITUDE, longitude_degrees=LONGITUDE,
+                                      elevation_m=ELEVATION)
+    elif name == 'timezone':
+        import pytz
+        value = pytz.timezone('US/Eastern')
+    else:
+        raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
+    globals()[name] = value
+    return value
@@ -1,55 +1,186 @@
 '''  Where are the Sun, Moon and planets right now?
         python -m astro
+
+    Keep everything loaded for quick answers, see astro/server.py:
+        python -m astro --serve
+
+    Keep the listing on the screen, refreshing each body as it moves:
+        python -m astro --watch
+
+    Or over a range of times, one CSV row per body per instant:
+        python -m astro --start 2015-06-01 --end 2015-07-01 --step 1
 '''
-from collections import namedtuple
+import argparse
+import csv
+import datetime
+import sys
 from operator import attrgetter
-from skyfield.api import earth, moon, sun, now, nine_planets, Star
-from . import home, timezone
-from .symbols import get_symbols
-from .satellites import get_satellites
 
-Position = namedtuple('Position', 'name alt azi symbol')
+# Number of instants evaluated per vectorized call in time-series mode.
+CHUNK = 1440
+
+
+def current(use_server=True, use_cache=True):
+    ''' Current positions of the Sun, Moon, Planets and some other interesting stuff.
+        Asks a running `--serve` process if there is one, and works them
+        out here if not, from saved fits for today when there are some
+        and `use_cache` is true.
+    '''
+    from . import timezone, Position
+    from . import timing
+    from .server import query
+    dt = datetime.datetime.now(datetime.timezone.utc)
+    print('The current time is', dt.astimezone(timezone).strftime('%H:%M %Z on %A %d %B %Y'))
+
+    positions = None
+    if use_server:
+        try:
+            positions = [Position(*p) for p in query({'op': 'positions', 'utc': dt.isoformat()})]
+        except OSError:
+            pass  # No server running.
+        except (RuntimeError, ValueError):
+            pass  # The server couldn't answer; work it out here instead.
+    if positions is None:
+        # Imported here, not at the top, so that the command starts quickly.
+        from skyfield.timelib import JulianDate
+        from .cache import ChebyshevCache
+        from .sky import SkySnapshot
+        snapshot = SkySnapshot()
+        # Today's fits, if a server or an earlier run has saved them.
+        if use_cache:
+            positions = ChebyshevCache(snapshot).positions(dt, build=False)
+    if positions is None:
+        with timing.stage('timescale'):
+            jd = JulianDate(utc=dt)
+        positions = snapshot.positions(jd)
+
+    with timing.stage('formatting'):
+        for p in sorted(positions, key=attrgetter('azi')):
+            print(format_position(p))
+
+
+def format_position(p):
+    if p.alt > 0:
+        prefix = '↑' if p.azi <= 180 else '↓'  # TODO: might not be correct for ISS.
+    else:
+        prefix = ' '
+    return '{1:2s} {0.symbol} {0.name:10s} {0.alt:3.0f}° at {0.azi:03.0f}°'.format(p, prefix)
+
+
+# Seconds between recalculations, for bodies that move noticeably faster
+# than the rest. Satellites not listed here are done every second.
+CADENCE = {'Moon': 5}
+DEFAULT_CADENCE = 60
+SATELLITE_CADENCE = 1
+
+
+def watch():
+    ''' Keep the listing on the screen, recalculating each body only as
+        often as it moves enough to matter and reusing the other rows.
+    '''
+    import time
+    from skyfield.timelib import JulianDate
+    from . import timezone
+    from .sky import SkySnapshot
+
+    snapshot = SkySnapshot()
+    cadence = {name: CADENCE.get(name, SATELLITE_CADENCE if name in snapshot.satellites else DEFAULT_CADENCE)
+               for name in snapshot.names}
+    due = dict.fromkeys(snapshot.names, 0.0)
+    rows = {}
+    try:
+        while True:
+            now = time.monotonic()
+            names = [name for name, when in due.items() if when <= now]
+            dt = datetime.datetime.now(datetime.timezone.utc)
+            for p in snapshot.positions(JulianDate(utc=dt), names):
+                rows[p.name] = format_position(p), p.azi
+            for name in names:
+                due[name] = now + cadence[name]
+            lines = [line for line, azi in sorted(rows.values(), key=lambda row: row[1])]
+            print('\033[H\033[J', end='')  # home the cursor and clear the screen
+            print(dt.astimezone(timezone).strftime('%H:%M:%S %Z on %A %d %B %Y'))
+            print('\n'.join(lines), flush=True)
+            time.sleep(max(0.0, min(due.values()) - time.monotonic()))
+    except KeyboardInterrupt:
+        pass
+
 
+def generate_rows(start, end, step, snapshot=None):
+    ''' Yield (utc, name, alt, azi) for every body from `start` up to `end`
+        every `step` minutes. Each body is evaluated over a whole chunk of
+        times in one call, and rows are yielded as each chunk is finished.
+    '''
+    import numpy as np
+    from skyfield.timelib import JulianDate
+    from .sky import SkySnapshot
+    if snapshot is None:
+        snapshot = SkySnapshot()
+    start = start.astimezone(datetime.timezone.utc)
+    total = int((end - start).total_seconds() // 60 // step) + 1
+    for first in range(0, total, CHUNK):
+        minutes = np.arange(first, min(first + CHUNK, total)) * step
+        jd = JulianDate(utc=(start.year, start.month, start.day, start.hour,
+                             start.minute + minutes))
+        positions = snapshot.positions(jd)
+        for i, minute in enumerate(minutes):
+            utc = start + datetime.timedelta(minutes=int(minute))
+            for p in positions:
+                yield utc, p.name, p.alt[i], p.azi[i]
 
-STARS = {
-    'Sirius': Star(ra_hours=(6, 45, 9.3), dec_degrees=(-16, -42, -47.2)),
-    'Vega': Star(ra_hours=(18, 36, 52), dec_degrees=(38, 47)),
-}
 
+def time_series(start, end, step, out=sys.stdout):
+    writer = csv.writer(out)
+    writer.writerow(('utc', 'name', 'alt', 'azi'))
+    for utc, name, alt, azi in generate_rows(start, end, step):
+        writer.writerow((utc.strftime('%Y-%m-%dT%H:%M:%SZ'), name,
+                         '{:.3f}'.format(alt), '{:.3f}'.format(azi)))
 
-def current():
-    'Current positions of the Sun, Moon, Planets and some other interesting stuff.'
-    t = now()
-    print('The current time is', t.astimezone(timezone).strftime('%H:%M %Z on %A %d %B %Y'))
 
-    # Generate positions for all the interesting stuff.
-    def generate_positions(jd):
-        symbols = get_symbols()
+def local_datetime(text):
+    'A date, and optionally a time, from the command line in local time.'
+    from . import timezone
+    dt = datetime.datetime.strptime(text, '%Y-%m-%d %H:%M' if ' ' in text else '%Y-%m-%d')
+    return timezone.localize(dt)
 
-        for body in (sun, moon) + nine_planets:
-            if body != earth:
-                alt, azi, _ = home(jd).observe(body).apparent().altaz()
-                name = body.jplname.capitalize()
-                yield Position(name, alt._degrees, azi._degrees, symbols.get(name.upper(), ' '))
 
-        # Now the stars
-        for name, star in STARS.items():
-            alt, azi, _ = home(jd).observe(star).apparent().altaz()
-            yield Position(name, alt._degrees, azi._degrees, symbols['BLACK STAR'])
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Where are the Sun, Moon and planets?')
+    parser.add_argument('--start', type=local_datetime, help='"YYYY-MM-DD[ HH:MM]", local time')
+    parser.add_argument('--end', type=local_datetime, help='"YYYY-MM-DD[ HH:MM]", local time')
+    parser.add_argument('--step', type=int, default=1, help='minutes between rows')
+    parser.add_argument('--serve', action='store_true', help='answer queries on a Unix socket')
+    parser.add_argument('--watch', action='store_true', help='keep the listing up to date on screen')
+    parser.add_argument('--profile', nargs='?', const='table', choices=['table', 'json'],
+                        help='time each stage of the calculation, per body')
+    args = parser.parse_args(argv)
 
-        # Earth satellites are special.
-        satellites = get_satellites()
-        sat = satellites['ISS (ZARYA)']
-        alt, azi, _ = home(jd).observe(sat).altaz()
-        yield Position('ISS', alt._degrees, azi._degrees, ' ')
+    if args.serve:
+        from .server import serve
+        try:
+            serve()
+        except RuntimeError as e:
+            parser.exit(1, '{}\n'.format(e))
+        return
+    if args.watch:
+        watch()
+        return
 
-    for p in sorted(generate_positions(t), key=attrgetter('azi')):
-        if p.alt > 0:
-            prefix = '↑' if p.azi <= 180 else '↓'  # TODO: might not be correct for ISS.
+    if args.start is None and args.end is None:
+        if args.profile:
+            from . import timing
+            timings = timing.enable()
+            current(use_server=False, use_cache=False)
+            print(timings.table() if args.profile == 'table' else timings.json(), file=sys.stderr)
         else:
-            prefix = ' '
-        print('{1:2s} {0.symbol} {0.name:10s} {0.alt:3.0f}° at {0.azi:03.0f}°'.format(p, prefix))
+            current()
+        return
+    if args.start is None or args.end is None:
+        parser.error('--start and --end go together')
+    if args.end < args.start or args.step < 1:
+        parser.error('need --start before --end and a positive --step')
+    time_series(args.start, args.end, args.step)
 
 
 if __name__ == '__main__':
-    current()
+    main()
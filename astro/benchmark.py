@@ -0,0 +1,182 @@
+''' Benchmarks for the hot paths, with fixed synthetic inputs so they run
+    the same way every time and need no network.
+
+        python -m astro.benchmark run -o before.json
+        ... change something ...
+        python -m astro.benchmark run -o after.json
+        python -m astro.benchmark compare before.json after.json
+
+    `compare` exits with status 1 if anything got slower than the threshold.
+'''
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+
+# A real ISS element set, copied under different names and catalog numbers.
+ISS = (
+    '1 25544U 98067A   15180.54791667  .00016717  00000-0  10270-3 0  9005',
+    '2 25544  51.6416 247.4627 0006703 130.5360 325.0288 15.72125391563537',
+)
+SATELLITE_COUNT = 1000
+WHEN = datetime.datetime(2015, 6, 29, 13, 0, tzinfo=datetime.timezone.utc)
+
+BENCHMARKS = OrderedDict()
+
+
+def benchmark(repeat):
+    'Register a function that sets up and returns the callable to time.'
+    def register(setup):
+        BENCHMARKS[setup.__name__] = (setup, repeat)
+        return setup
+    return register
+
+
+def checksum(line):
+    return sum(int(c) if c.isdigit() else c == '-' for c in line[:68]) % 10
+
+
+def write_elements(directory, count=SATELLITE_COUNT):
+    'A synthetic two-line element file of `count` satellites.'
+    path = os.path.join(directory, 'visual.txt')
+    with open(path, 'w') as f:
+        for n in range(count):
+            name = 'ISS (ZARYA)' if n == 0 else 'SYNTHETIC {}'.format(n)
+            lines = [line[:2] + '{:05d}'.format(n + 1) + line[7:68] for line in ISS]
+            f.write('{}\n{}{}\n{}{}\n'.format(name, lines[0], checksum(lines[0]),
+                                              lines[1], checksum(lines[1])))
+    return path
+
+
+@benchmark(repeat=5)
+def current(directory):
+    from skyfield.timelib import JulianDate
+    from .satellites import get_satellites
+    from .sky import SkySnapshot
+    jd = JulianDate(utc=WHEN)
+    store = get_satellites(write_elements(directory, 1))
+    return lambda: SkySnapshot(store=store).positions(jd)
+
+
+@benchmark(repeat=3)
+def generate_tables(directory):
+    from .table import generate_tables
+    path = os.path.join(directory, 'sun.bin')
+    return lambda: generate_tables(days=7, path=path)
+
+
+@benchmark(repeat=5)
+def table_lookup(directory):
+    import numpy as np
+    from .table import Table, write_table, START
+    n = 365 * 360
+    t = np.arange(n) * 2 * np.pi / 360
+    path = os.path.join(directory, 'lookup.bin')
+    write_table(path, START, 240, 40 * np.sin(t), (180 + 100 * np.sin(t)) % 360)
+    table = Table(path)
+    times = [WHEN + datetime.timedelta(seconds=97 * i) for i in range(10000)]
+    return lambda: [table.lookup(dt) for dt in times]
+
+
+@benchmark(repeat=5)
+def get_satellites(directory):
+    from .satellites import TLEStore
+    path = write_elements(directory)
+
+    def load():
+        for name in os.listdir(directory):
+            if name.endswith('.index.json'):
+                os.unlink(os.path.join(directory, name))
+        return TLEStore(path)['ISS (ZARYA)']
+    return load
+
+
+@benchmark(repeat=5)
+def propagation(directory):
+    from . import geometry
+    from .satellites import Constellation, TLEStore
+    constellation = Constellation(TLEStore(write_elements(directory)))
+    jd = geometry.julian_date(WHEN, range(0, 3600, 60))
+    return lambda: constellation.altaz(jd)
+
+
+@benchmark(repeat=20)
+def get_symbols(directory):
+    from .symbols import get_symbols
+    return get_symbols
+
+
+def run(names=None, out=sys.stdout):
+    results = OrderedDict()
+    for name, (setup, repeat) in BENCHMARKS.items():
+        if names and name not in names:
+            continue
+        with tempfile.TemporaryDirectory() as directory:
+            function = setup(directory)
+            times = []
+            for _ in range(repeat):
+                starting = time.perf_counter()
+                function()
+                times.append(time.perf_counter() - starting)
+        results[name] = {'min': min(times), 'median': statistics.median(times), 'repeat': repeat}
+        print('{:16s} {:10.6f} s median {:10.6f} s min'.format(
+            name, results[name]['median'], results[name]['min']), file=out)
+    return {
+        'when': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'results': results,
+    }
+
+
+def compare(baseline, current, threshold=1.10, out=sys.stdout):
+    ''' Print the ratio of each median to the baseline. Returns the names of
+        benchmarks slower by more than `threshold`.
+    '''
+    slower = []
+    for name, result in current['results'].items():
+        if name not in baseline['results']:
+            print('{:16s} {:>10s}'.format(name, 'new'), file=out)
+            continue
+        ratio = result['median'] / baseline['results'][name]['median']
+        flag = ''
+        if ratio > threshold:
+            flag = 'SLOWER'
+            slower.append(name)
+        print('{:16s} {:9.2f}x {}'.format(name, ratio, flag), file=out)
+    return slower
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks for the astro package.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    run_parser = commands.add_parser('run')
+    run_parser.add_argument('names', nargs='*', metavar='name',
+                            help='any of: ' + ', '.join(BENCHMARKS))
+    run_parser.add_argument('-o', '--output', help='JSON results file')
+    compare_parser = commands.add_parser('compare')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=1.10)
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        unknown = set(args.names) - set(BENCHMARKS)
+        if unknown:
+            parser.error('unknown benchmark: ' + ', '.join(sorted(unknown)))
+        results = run(args.names)
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(results, f, indent=2)
+    else:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.current) as f:
+            current_results = json.load(f)
+        sys.exit(1 if compare(baseline, current_results, args.threshold) else 0)
@@ -0,0 +1,152 @@
+''' Chebyshev fits of where everything is in the sky from home, one day at a time.
+
+    The first query for a day runs the full skyfield pipeline over a grid
+    of times covering that day, then fits Chebyshev polynomials to the unit
+    vector of each body's apparent altitude and azimuth. After that a query
+    is a polynomial evaluation. Fitting the unit vector rather than the
+    angles avoids trouble with azimuth wrapping and near the zenith.
+
+    Fitted days are kept in memory, least recently used first out, and
+    saved to disk so another process can pick them up. Saved days are for
+    one observer, and are refitted when the satellite elements change.
+'''
+import datetime
+import os
+from collections import OrderedDict
+import numpy as np
+from numpy.polynomial import chebyshev
+from skyfield.timelib import JulianDate
+from . import CACHE_DIR
+from .geometry import horizon_vectors
+from .sky import Position, SkySnapshot
+
+DIRECTORY = os.path.join(CACHE_DIR, 'chebyshev')
+DEGREE = 10
+
+# (sample spacing, segment length) in seconds. Satellites move a lot faster.
+SLOW = (60, 3600)
+FAST = (10, 300)
+
+
+def fit(vectors, samples_per_segment, degree=DEGREE):
+    ''' Chebyshev coefficients, shaped (segment, xyz, degree + 1), for a
+        (3, n) array of unit vectors sampled evenly through the day.
+    '''
+    segments = (vectors.shape[1] - 1) // samples_per_segment
+    x = np.linspace(-1, 1, samples_per_segment + 1)
+    coefficients = np.empty((segments, 3, degree + 1))
+    for k in range(segments):
+        first = k * samples_per_segment
+        y = vectors[:, first:first + samples_per_segment + 1]
+        coefficients[k] = chebyshev.chebfit(x, y.T, degree).T
+    return coefficients
+
+
+def fit_day(snapshot, date, degree=DEGREE):
+    'Return names, symbols and coefficients for every body on a UTC date.'
+    names, symbols, coefficients = [], [], []
+    groups = (
+        (SLOW, [name for name in snapshot.names if name not in snapshot.satellites]),
+        (FAST, list(snapshot.satellites)),
+    )
+    for (spacing, segment), wanted in groups:
+        if not wanted:
+            continue
+        seconds = np.arange(0, 86400 + spacing, spacing)
+        jd = JulianDate(utc=(date.year, date.month, date.day, 0, 0, seconds))
+        for p in snapshot.positions(jd, wanted):
+            names.append(p.name)
+            symbols.append(p.symbol)
+            coefficients.append(fit(horizon_vectors(p.alt, p.azi), segment // spacing, degree))
+    return names, symbols, coefficients
+
+
+class ChebyshevCache:
+    ''' Positions of every body in a `SkySnapshot`, from per-day fits.
+        At most `maxsize` days are held in memory.
+    '''
+    def __init__(self, snapshot=None, maxsize=8, directory=DIRECTORY, degree=DEGREE):
+        self.snapshot = snapshot if snapshot is not None else SkySnapshot()
+        self.maxsize = maxsize
+        self.directory = directory
+        self.degree = degree
+        self.days = OrderedDict()
+
+    def path(self, date):
+        observer = self.snapshot.observer
+        name = '{:%Y-%m-%d}_{:.4f}_{:.4f}_{:.0f}_{}.npz'.format(
+            date, observer.latitude._degrees, observer.longitude._degrees,
+            observer.elevation.km * 1000, self.degree)
+        return os.path.join(self.directory, name)
+
+    def epochs(self):
+        'The element epochs of the satellites, which make a saved day stale when they change.'
+        return np.array([sat.epoch.tt for sat in self.snapshot.satellites.values()], dtype=float)
+
+    def load(self, date):
+        path = self.path(date)
+        try:
+            with np.load(path) as data:
+                names, symbols = list(data['names']), list(data['symbols'])
+                coefficients = [data['c{}'.format(i)] for i in range(len(names))]
+                epochs = data['epochs']
+        except (OSError, KeyError, ValueError):
+            return None
+        # A file from an older set of bodies, or older elements, is no good.
+        if names != self.snapshot.names or not np.array_equal(epochs, self.epochs()):
+            return None
+        return names, symbols, coefficients
+
+    def save(self, date, day):
+        names, symbols, coefficients = day
+        os.makedirs(self.directory, exist_ok=True)
+        arrays = {'c{}'.format(i): c for i, c in enumerate(coefficients)}
+        temporary = self.path(date) + '.tmp.npz'
+        np.savez(temporary, names=names, symbols=symbols, epochs=self.epochs(), **arrays)
+        os.replace(temporary, self.path(date))
+
+    def day(self, date, build=True):
+        ''' The fits for a UTC date, built and saved if need be. With
+            `build` false, None unless they are already in memory or on disk.
+        '''
+        if date in self.days:
+            self.days.move_to_end(date)
+            return self.days[date]
+        day = self.load(date)
+        if day is None:
+            if not build:
+                return None
+            day = fit_day(self.snapshot, date, self.degree)
+            self.save(date, day)
+        self.add(date, day)
+        return day
+
+    def add(self, date, day):
+        'Hold the fits for a date, made elsewhere, in memory.'
+        self.days[date] = day
+        self.days.move_to_end(date)
+        while len(self.days) > self.maxsize:
+            self.days.popitem(last=False)
+
+    def positions(self, dt, names=None, build=True):
+        ''' A `Position` for every body, or just those in `names`, at an
+            aware datetime. None if `build` is false and the day isn't fitted.
+        '''
+        dt = dt.astimezone(datetime.timezone.utc)
+        day = self.day(dt.date(), build)
+        if day is None:
+            return None
+        seconds = dt.hour * 3600 + dt.minute * 60 + dt.second + dt.microsecond / 1e6
+        positions = []
+        for name, symbol, c in zip(*day):
+            if names is not None and name not in names:
+                continue
+            # Which segment, and where in it on the [-1, 1] Chebyshev interval.
+            s = seconds * len(c) / 86400
+            k = min(int(s), len(c) - 1)
+            x = 2 * (s - k) - 1
+            v = chebyshev.chebval(x, c[k].T)
+            alt = np.degrees(np.arcsin(np.clip(v[2] / np.linalg.norm(v), -1, 1)))
+            azi = np.degrees(np.arctan2(v[1], v[0])) % 360
+            positions.append(Position(name, alt, azi, symbol))
+        return positions
@@ -0,0 +1,110 @@
+''' Close approaches between the Moon and the planets, for as many years
+    as you like. Results are logged to stderr and written as JSON to
+    stdout, so the following can be convenient:
+
+        python -m astro.conjunctions 2015 2016 > close-approaches.json
+
+    For each year the separation of every pair of bodies is computed as a
+    matrix over a coarse grid of times, all in a few array operations. Only
+    the local minima under the threshold are refined, all together, and
+    the years are spread across processes.
+'''
+import argparse
+import datetime
+import itertools
+import json
+import logging
+import sys
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from skyfield.timelib import JulianDate
+from . import geometry, search
+from .ephemeris import load
+from .events import year, utc_datetime
+
+logger = logging.getLogger(__name__)
+
+BODIES = ('moon', 'venus', 'jupiter', 'mars', 'saturn', 'mercury')
+THRESHOLD = 20.0  # degrees
+STEP = 0.25  # days; the Moon moves about 3° in that time
+DUBLIN_JULIAN_DATE = 2415020.0  # Julian date of PyEphem's day 0
+
+
+def directions(names, t):
+    'Geocentric apparent unit vectors, shaped (body, xyz, time), at TT dates.'
+    bodies = load()
+    everything = {body.jplname: body for body in (bodies['moon'],) + tuple(bodies['nine_planets'])}
+    here = bodies['earth'](JulianDate(tt=np.asarray(t, dtype=float)))
+    vectors = np.array([here.observe(everything[name]).apparent().position.AU for name in names])
+    return vectors / np.sqrt((vectors * vectors).sum(axis=1))[:, None]
+
+
+def close_approaches(y, names=BODIES, threshold=THRESHOLD, step=STEP):
+    'Every minimum of separation under `threshold` between pairs of `names` in a year.'
+    start, end = year(y)
+    t = np.arange(start - step, end + 2 * step, step)
+    u = directions(names, t)
+
+    # Separation matrix over time, (body, body, time), from the dot products.
+    cosine = np.clip(np.einsum('ikt,jkt->ijt', u, u), -1, 1)
+    separation = np.degrees(np.arccos(cosine))
+
+    first, second, k = [], [], []
+    for i, j in itertools.combinations(range(len(names)), 2):
+        s = separation[i, j]
+        minima = np.flatnonzero((s[:-2] > s[1:-1]) & (s[1:-1] <= s[2:]) & (s[1:-1] < threshold)) + 1
+        first += [i] * len(minima)
+        second += [j] * len(minima)
+        k += list(minima)
+    first, second, k = np.array(first, dtype=int), np.array(second, dtype=int), np.array(k, dtype=int)
+    if not len(k):
+        return []
+
+    def f(x):
+        v = directions(names, x)
+        n = np.arange(len(x))
+        return geometry.angle(v[first, :, n].T, v[second, :, n].T)
+
+    iterations = int(np.ceil(np.log2(2 * step * 86400)))
+    when = search.minimum(f, t[k - 1], t[k + 1], iterations, delta=1e-5)
+    least = f(when)
+
+    results = []
+    for w, i, j, sep in sorted(zip(when, first, second, least)):
+        if start <= w < end and sep < threshold:
+            logger.info('{} {:8s} {:8s} {:6.3f}°'.format(y, names[i], names[j], sep))
+            results.append(info(w, names[i], names[j], sep))
+    return results
+
+
+def info(tt, body1, body2, separation):
+    ''' A dictionary of useful info that is easily serialized to JSON, as
+        written by obsolete/close_approaches.py: the UTC date as a tuple, the
+        Dublin Julian Date (UTC), and the separation in radians.
+    '''
+    dt = utc_datetime(tt)
+    return {
+        'date': [dt.year, dt.month, dt.day, dt.hour, dt.minute, dt.second + dt.microsecond / 1e6],
+        'DJD': float(geometry.julian_date(dt) - DUBLIN_JULIAN_DATE),
+        'body1': body1.capitalize(),
+        'body2': body2.capitalize(),
+        'separation': float(np.radians(separation)),
+    }
+
+
+def all_years(years, workers=None):
+    'Close approaches for each year, computed in parallel, in order.'
+    logger.info('Close approaches for {}'.format(', '.join(map(str, years))))
+    with ProcessPoolExecutor(workers) as pool:
+        return [approach for approaches in pool.map(close_approaches, years)
+                for approach in approaches]
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(message)s', stream=sys.stderr)
+    parser = argparse.ArgumentParser(description='Close approaches of the Moon and planets.')
+    parser.add_argument('years', type=int, nargs='*', help='default: this year')
+    parser.add_argument('--workers', type=int)
+    args = parser.parse_args()
+    years = args.years or [datetime.date.today().year]
+    json.dump(all_years(years, args.workers), sys.stdout, indent=1)
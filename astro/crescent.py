@@ -0,0 +1,200 @@
+''' Where on Earth can the young (or old) crescent Moon be seen?
+
+    For a New Moon, this evaluates the Yallop and Odeh visibility criteria
+    over a whole latitude/longitude grid. The geocentric places of the Sun
+    and Moon are computed once on a fine time grid. Then local sunset and
+    moonset, the "best time" and the crescent geometry are worked out with
+    plain array arithmetic, for a band of latitude at a time to keep the
+    (time, cell) arrays small.
+
+        python -m astro.crescent 2015 2016 -o maps/
+
+    writes an NPZ file and a PPM image (Yallop categories) for each New Moon.
+    Yallop, NAO Technical Note 69 (1997); Odeh, Experimental Astronomy
+    18 (2004).
+'''
+import argparse
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from skyfield.timelib import JulianDate
+from . import geometry
+from .ephemeris import apparent_sun, load
+from .events import MOON_HORIZON, SUN_HORIZON, utc_datetime
+from .phases import new_moons
+
+STEP = 5 / 1440  # days between samples of the Sun and Moon
+RESOLUTION = 2.0  # degrees between grid cells
+BAND = 10.0  # degrees of latitude worked on at once, to bound memory
+EARTH_RADIUS_AU = 6378.137 / 149597870.7
+
+Map = namedtuple('Map', 'new_moon latitude longitude best q yallop v odeh')
+
+YALLOP = (0.216, -0.014, -0.160, -0.232, -0.293)  # lower bounds of A to E
+ODEH = (5.65, 2.0, -0.96)  # lower bounds of A to C
+NO_DATA = 255
+
+# Colours for the image: Yallop A to F, then cells with no sunset or moonset.
+COLOURS = np.array([
+    (0, 160, 0), (120, 200, 0), (230, 200, 0), (240, 130, 0), (200, 40, 40),
+    (60, 60, 60), (0, 0, 0)], dtype=np.uint8)
+
+
+def sky(start, end, step=STEP):
+    ''' Times, and the Sun's and Moon's right ascension and declination of
+        date (radians), Moon distance (AU), and Greenwich sidereal time.
+    '''
+    bodies = load()
+    t = np.arange(start, end + step, step)
+    jd = JulianDate(tt=t)
+    here = bodies['earth'](jd)
+    sun_ra, sun_dec, _ = apparent_sun(here).radec(epoch='date')
+    moon_ra, moon_dec, moon_distance = here.observe(bodies['moon']).apparent().radec(epoch='date')
+    return (t, np.unwrap(sun_ra.radians), sun_dec.radians,
+            np.unwrap(moon_ra.radians), moon_dec.radians, moon_distance.AU,
+            np.unwrap(geometry.gmst(jd.ut1)))
+
+
+def crossing(t, alt, h0, rising, after=None, before=None):
+    ''' For each column of `alt` (time, place), the time it crosses `h0`,
+        going up if `rising` else down. With `after` the first such crossing
+        after that time (per place) is found; with `before`, the last one
+        before it. NaN where there is none.
+    '''
+    above = alt > h0
+    c = (~above[:-1] & above[1:]) if rising else (above[:-1] & ~above[1:])
+    if after is not None:
+        c &= t[1:, None] > after
+        k = np.argmax(c, axis=0)
+    else:
+        c &= t[:-1, None] < before
+        k = len(c) - 1 - np.argmax(c[::-1], axis=0)
+    n = np.arange(alt.shape[1])
+    a0, a1 = alt[k, n], alt[k + 1, n]
+    when = t[k] + (h0 - a0) / (a1 - a0) * (t[1] - t[0])
+    return np.where(c.any(axis=0), when, np.nan)
+
+
+def topocentric(alt, distance):
+    'Airless topocentric altitude of the Moon from its geocentric altitude.'
+    return alt - np.arcsin(EARTH_RADIUS_AU / distance) * np.cos(alt)
+
+
+def band(places, t0, evening, lat, lon):
+    ''' Best time, Yallop's q and Odeh's V for the cells at `lat`, `lon`
+        (radians), from the Sun and Moon `places` given by `sky`. NaN where
+        there is no sunset followed by moonset (sunrise preceded by
+        moonrise, in the morning).
+    '''
+    t, sun_ra, sun_dec, moon_ra, moon_dec, distance, gst = places
+    sun_alt, _ = geometry.horizon(sun_ra[:, None], sun_dec[:, None], gst[:, None], lat, lon)
+    moon_alt, _ = geometry.horizon(moon_ra[:, None], moon_dec[:, None], gst[:, None], lat, lon)
+    moon_alt = topocentric(moon_alt, distance[:, None])
+    # Both horizons allow for refraction and semi-diameter, on airless topocentric altitude.
+    h_sun, h_moon = np.radians(SUN_HORIZON), np.radians(MOON_HORIZON)
+    if evening:
+        sunset = crossing(t, sun_alt, h_sun, False, after=t0)
+        moonset = crossing(t, moon_alt, h_moon, False, after=np.nan_to_num(sunset, nan=np.inf))
+        lag = moonset - sunset
+        best = sunset + 4 / 9 * lag
+    else:
+        sunrise = crossing(t, sun_alt, h_sun, True, before=t0)
+        moonrise = crossing(t, moon_alt, h_moon, True, before=np.nan_to_num(sunrise, nan=-np.inf))
+        lag = sunrise - moonrise
+        best = sunrise - 4 / 9 * lag
+
+    # Everything at each place's best time.
+    b = np.nan_to_num(best, nan=t[0])
+
+    def at(values):
+        return np.interp(b, t, values)
+    s_alt, s_az = geometry.horizon(at(sun_ra), at(sun_dec), at(gst), lat, lon)
+    geocentric, m_az = geometry.horizon(at(moon_ra), at(moon_dec), at(gst), lat, lon)
+    hp = np.arcsin(EARTH_RADIUS_AU / at(distance))
+    m_alt = topocentric(geocentric, at(distance))
+
+    # Yallop's q takes the geocentric ARCV, Odeh's V the topocentric one;
+    # both take the topocentric crescent width.
+    arcv = np.degrees(m_alt - s_alt)
+    daz = np.degrees(s_az - m_az)
+    arcl = np.arccos(np.clip(np.cos(np.radians(arcv)) * np.cos(np.radians(daz)), -1, 1))
+    semidiameter = 0.27245 * np.degrees(hp) * 60 * (1 + np.sin(m_alt) * np.sin(hp))  # arcmin
+    w = semidiameter * (1 - np.cos(arcl))
+    q = (np.degrees(geocentric - s_alt) - (11.8371 - 6.3226 * w + 0.7319 * w ** 2 - 0.1018 * w ** 3)) / 10
+    v = arcv - (7.1651 - 6.3226 * w + 0.7319 * w ** 2 - 0.1018 * w ** 3)
+
+    valid = np.isfinite(best) & (lag > 0)
+    return np.where(valid, best, np.nan), np.where(valid, q, np.nan), np.where(valid, v, np.nan)
+
+
+def visibility(new_moon, days=0, evening=True, resolution=RESOLUTION, step=STEP):
+    ''' The crescent `days` after (evening) or before (morning) the New Moon
+        at TT date `new_moon`, over the whole globe. The grid is done a band
+        of latitude at a time, as every cell needs the whole time series.
+    '''
+    latitude = np.arange(-90 + resolution / 2, 90, resolution)
+    longitude = np.arange(-180 + resolution / 2, 180, resolution)
+    lat, lon = (np.radians(a).ravel() for a in np.meshgrid(latitude, longitude, indexing='ij'))
+
+    t0 = new_moon + days if evening else new_moon - days
+    start, end = (t0, t0 + 2) if evening else (t0 - 2, t0)
+    places = sky(start, end, step)
+
+    best, q, v = (np.empty(len(lat)) for _ in range(3))
+    cells = max(1, int(BAND / resolution)) * len(longitude)
+    for first in range(0, len(lat), cells):
+        cut = slice(first, first + cells)
+        best[cut], q[cut], v[cut] = band(places, t0, evening, lat[cut], lon[cut])
+
+    valid = np.isfinite(best)
+    yallop = np.where(valid, np.searchsorted(-np.array(YALLOP), -q, side='left'), NO_DATA)
+    odeh = np.where(valid, np.searchsorted(-np.array(ODEH), -v, side='left'), NO_DATA)
+
+    shape = (len(latitude), len(longitude))
+    return Map(new_moon, latitude, longitude, best.reshape(shape),
+               q.reshape(shape).astype(np.float32), yallop.reshape(shape).astype(np.uint8),
+               v.reshape(shape).astype(np.float32), odeh.reshape(shape).astype(np.uint8))
+
+
+def save(m, path):
+    'Write the map as `path`.npz and a Yallop category image as `path`.ppm.'
+    np.savez_compressed(path + '.npz', **m._asdict())
+    codes = np.where(m.yallop == NO_DATA, len(COLOURS) - 1, m.yallop)
+    pixels = COLOURS[codes[::-1]]  # north at the top
+    with open(path + '.ppm', 'wb') as f:
+        f.write('P6 {} {} 255\n'.format(pixels.shape[1], pixels.shape[0]).encode('ascii'))
+        f.write(pixels.tobytes())
+
+
+def lunation(new_moon, directory, resolution=RESOLUTION, days=(0, 1, 2)):
+    'Evening and morning maps for one New Moon, saved into `directory`.'
+    stamp = '{:%Y-%m-%d}'.format(utc_datetime(new_moon))
+    for day in days:
+        for evening, kind in ((True, 'young'), (False, 'old')):
+            m = visibility(new_moon, day, evening, resolution)
+            save(m, os.path.join(directory, '{}_{}_{}'.format(stamp, kind, day)))
+    return stamp
+
+
+def all_lunations(first_year, last_year, directory, resolution=RESOLUTION, workers=None):
+    'Maps for every New Moon in a range of years, one lunation per process.'
+    os.makedirs(directory, exist_ok=True)
+    moons = new_moons(first_year, last_year)
+    with ProcessPoolExecutor(workers) as pool:
+        jobs = [pool.submit(lunation, t, directory, resolution) for t in moons]
+        for job in jobs:
+            yield job.result()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Crescent Moon visibility maps.')
+    parser.add_argument('first', type=int)
+    parser.add_argument('last', type=int, nargs='?')
+    parser.add_argument('-o', '--output', default='crescent')
+    parser.add_argument('--resolution', type=float, default=RESOLUTION, help='degrees')
+    parser.add_argument('--workers', type=int)
+    args = parser.parse_args()
+    for stamp in all_lunations(args.first, args.last or args.first, args.output,
+                               args.resolution, args.workers):
+        print(stamp)
@@ -0,0 +1,77 @@
+''' The planetary ephemeris, prepared once and kept as a pickle.
+
+    Importing `skyfield.api` builds the ephemeris from scratch every time,
+    which is most of the start-up cost of a short-lived command. Instead
+    the prepared bodies are pickled under ~/.cache/astro the first time
+    and unpickled after that. The snapshot is rebuilt whenever the
+    installed skyfield changes.
+
+        python -m astro.ephemeris    # build or refresh the snapshot
+'''
+import importlib.util
+import os
+import pickle
+from . import CACHE_DIR
+
+SNAPSHOT = os.path.join(CACHE_DIR, 'ephemeris.pickle')
+
+_bodies = None
+
+
+def skyfield_signature():
+    'Identifies the installed skyfield without importing it.'
+    origin = importlib.util.find_spec('skyfield').origin
+    st = os.stat(os.path.dirname(origin))
+    return origin, st.st_mtime_ns
+
+
+def read_snapshot(path=SNAPSHOT):
+    try:
+        with open(path, 'rb') as f:
+            signature, bodies = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError, ValueError):
+        return None
+    return bodies if signature == skyfield_signature() else None
+
+
+def write_snapshot(path=SNAPSHOT):
+    'Build the bodies with skyfield and save them for next time.'
+    from skyfield import api
+    bodies = {
+        'earth': api.earth,
+        'sun': api.sun,
+        'moon': api.moon,
+        'nine_planets': api.nine_planets,
+    }
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary = path + '.tmp'
+        with open(temporary, 'wb') as f:
+            pickle.dump((skyfield_signature(), bodies), f, pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary, path)
+    except (OSError, pickle.PicklingError):
+        pass  # Still usable, just slower next time.
+    return bodies
+
+
+def load():
+    'A dict of earth, sun, moon and nine_planets.'
+    global _bodies
+    if _bodies is None:
+        _bodies = read_snapshot() or write_snapshot()
+    return _bodies
+
+
+def apparent_sun(here):
+    ''' The apparent position of the Sun seen from `here`. skyfield divides
+        by zero working out the Sun's deflection of its own light, which
+        NumPy would otherwise warn about.
+    '''
+    import numpy as np
+    with np.errstate(invalid='ignore'):
+        return here.observe(load()['sun']).apparent()
+
+
+if __name__ == '__main__':
+    write_snapshot()
+    print('Wrote', SNAPSHOT)
@@ -0,0 +1,192 @@
+''' Rising, setting, transit and twilight for whole years at a time.
+
+    Rather than asking for the next rising again and again, the altitude of
+    a body is computed on a coarse grid of times covering the whole period
+    in one call. Every horizon crossing and every meridian transit is
+    bracketed on that grid, then all of them are refined together by
+    bisection, each step evaluating the body at every bracket at once.
+
+    Times are TT Julian dates, as `JulianDate.tt`.
+
+        python -m astro.events 2015
+'''
+import argparse
+import datetime
+from collections import namedtuple
+import numpy as np
+from skyfield.timelib import JulianDate
+from . import home
+from . import search
+from .ephemeris import load
+
+Event = namedtuple('Event', 'tt name kind alt azi')
+
+STEP = 30 / 1440  # days between coarse samples
+
+# Topocentric altitude of the center of the body at rising and setting, in
+# degrees, allowing for refraction and, for the Sun and Moon, their size.
+# Parallax is already in the topocentric altitude.
+HORIZON = -0.5667
+SUN_HORIZON = -0.8333
+MOON_HORIZON = -0.8333
+
+# (altitude, morning event, evening event)
+TWILIGHT = (
+    (SUN_HORIZON, 'sunrise', 'sunset'),
+    (-6.0, 'civil dawn', 'civil dusk'),
+    (-12.0, 'nautical dawn', 'nautical dusk'),
+    (-18.0, 'astronomical dawn', 'astronomical dusk'),
+)
+
+
+def tt(dt):
+    'TT Julian date of an aware datetime.'
+    return JulianDate(utc=dt).tt
+
+
+def year(y):
+    'Start and end, as TT Julian dates, of a calendar year in UTC.'
+    return (tt(datetime.datetime(y, 1, 1, tzinfo=datetime.timezone.utc)),
+            tt(datetime.datetime(y + 1, 1, 1, tzinfo=datetime.timezone.utc)))
+
+
+def altaz(body, t, observer=home):
+    'Apparent altitude and azimuth in degrees of `body` at an array of TT dates.'
+    alt, azi, _ = observer(JulianDate(tt=np.asarray(t, dtype=float))).observe(body).apparent().altaz()
+    return alt._degrees, azi._degrees
+
+
+def iterations(t):
+    'Enough bisection steps to narrow a two-sample bracket to about a second.'
+    return max(1, int(np.ceil(np.log2(2 * (t[1] - t[0]) * 86400))))
+
+
+def crossings(t, alt, horizon, f):
+    ''' Refined times where the sampled altitude goes up through `horizon`
+        and where it comes down through it. `f` gives the altitude at any
+        array of times.
+    '''
+    up = alt > horizon
+    change = np.diff(up.astype(np.int8))
+    rising = np.flatnonzero(change == 1)
+    setting = np.flatnonzero(change == -1)
+
+    def g(x):
+        return f(x) - horizon
+    n = iterations(t)
+    return (search.bisect(g, t[rising], t[rising + 1], n),
+            search.bisect(g, t[setting], t[setting + 1], n))
+
+
+def transits(t, azi, f):
+    ''' Refined times of upper transit, when the body crosses the meridian
+        going west, and lower transit, going east below the pole. `f` gives
+        the sine of the azimuth, which has the sign of the body's eastward
+        direction and is zero on the meridian, at any array of times.
+    '''
+    change = np.diff((np.sin(np.radians(azi)) > 0).astype(np.int8))
+    upper = np.flatnonzero(change == -1)
+    lower = np.flatnonzero(change == 1)
+    n = iterations(t)
+    return (search.bisect(f, t[upper], t[upper + 1], n),
+            search.bisect(f, t[lower], t[lower + 1], n))
+
+
+def circumpolar(t, alt, horizon, start):
+    ''' An 'always up' or 'never up' event at the start of each whole day,
+        counted from `start`, in which the body does not cross the horizon.
+    '''
+    day = np.floor(t - start).astype(int)
+    up = alt > horizon
+    crossed = set(day[1:][up[1:] != up[:-1]])
+    events = []
+    for d in range(int(t[-1] - start)):
+        if d not in crossed:
+            i = np.searchsorted(day, d)
+            events.append((t[i], 'always up' if up[i] else 'never up'))
+    return events
+
+
+def find_events(body, name, start, end, horizon=HORIZON, observer=home, step=STEP,
+                transit=True):
+    ''' Every rising, setting and (optionally) upper and lower transit of
+        `body` between two TT dates, in time order.
+    '''
+    def f(x):
+        return altaz(body, x, observer)[0]
+
+    def g(x):
+        return np.sin(np.radians(altaz(body, x, observer)[1]))
+
+    # A step early, so that events in the first step are bracketed too.
+    t = np.arange(start - step, end + step, step)
+    alt, azi = altaz(body, t, observer)
+    found = []
+    rising, setting = crossings(t, alt, horizon, f)
+    found += [(x, 'rise') for x in rising] + [(x, 'set') for x in setting]
+    if transit:
+        upper, lower = transits(t, azi, g)
+        found += [(x, 'transit') for x in upper] + [(x, 'antitransit') for x in lower]
+    found += circumpolar(t, alt, horizon, start)
+    return finish(body, name, found, observer, start, end)
+
+
+def sun_events(start, end, observer=home, step=STEP):
+    'Sunrise, sunset, transit and every kind of twilight, in time order.'
+    sun = load()['sun']
+
+    def f(x):
+        return altaz(sun, x, observer)[0]
+
+    def g(x):
+        return np.sin(np.radians(altaz(sun, x, observer)[1]))
+
+    t = np.arange(start - step, end + step, step)
+    alt, azi = altaz(sun, t, observer)
+    found = []
+    for horizon, morning, evening in TWILIGHT:
+        rising, setting = crossings(t, alt, horizon, f)
+        found += [(x, morning) for x in rising] + [(x, evening) for x in setting]
+    upper, lower = transits(t, azi, g)
+    found += [(x, 'transit') for x in upper] + [(x, 'antitransit') for x in lower]
+    found += circumpolar(t, alt, SUN_HORIZON, start)
+    return finish(sun, 'Sun', found, observer, start, end)
+
+
+def finish(body, name, found, observer, start, end):
+    ''' Sort the (time, kind) pairs from `start` up to `end` and add the
+        altitude and azimuth, all in one call.
+    '''
+    found = sorted((x, kind) for x, kind in found if start <= x < end)
+    if not found:
+        return []
+    times = np.array([x for x, kind in found])
+    alt, azi = altaz(body, times, observer)
+    return [Event(x, name, kind, a, z) for (x, kind), a, z in zip(found, alt, azi)]
+
+
+def almanac(start, end, observer=home, step=STEP):
+    'Events for the Sun, with twilight, the Moon and the planets, in time order.'
+    bodies = load()
+    events = sun_events(start, end, observer, step)
+    events += find_events(bodies['moon'], 'Moon', start, end, MOON_HORIZON, observer, step)
+    for planet in bodies['nine_planets']:
+        if planet != bodies['earth']:
+            events += find_events(planet, planet.jplname.capitalize(), start, end,
+                                  HORIZON, observer, step)
+    events.sort()
+    return events
+
+
+def utc_datetime(t):
+    return JulianDate(tt=t).utc_datetime()
+
+
+if __name__ == '__main__':
+    from . import timezone
+    parser = argparse.ArgumentParser(description='Rise, set, transit and twilight for a year.')
+    parser.add_argument('year', type=int, nargs='?', default=datetime.date.today().year)
+    args = parser.parse_args()
+    for e in almanac(*year(args.year)):
+        print('{:%Y-%m-%d %H:%M:%S} {:10s} {:18s} {:5.1f}° at {:05.1f}°'.format(
+            utc_datetime(e.tt).astimezone(timezone), e.name, e.kind, e.alt, e.azi))
@@ -0,0 +1,97 @@
+''' Plain NumPy geometry for when a whole array of positions needs turning
+    into altitude and azimuth at once and skyfield's per-object path is too
+    slow. Accuracy is at the level of ignoring polar motion and UT1 - UTC,
+    which is fine for pointing at things in the sky.
+'''
+import datetime
+import numpy as np
+
+J2000 = 2451545.0
+UNIX_EPOCH = 2440587.5  # Julian date of 1970-01-01 00:00 UTC
+
+# WGS84
+EARTH_RADIUS = 6378.137  # km
+FLATTENING = 1 / 298.257223563
+EARTH_ROTATION = 7.292115146706979e-5  # radians per second
+
+
+def julian_date(dt, seconds=0.0):
+    'Julian date (UTC) of an aware datetime plus an offset, or array of offsets, in seconds.'
+    return UNIX_EPOCH + (dt.timestamp() + np.asarray(seconds, dtype=float)) / 86400
+
+
+def datetime_from_julian(jd):
+    'An aware UTC datetime for a single Julian date.'
+    epoch = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+    return epoch + datetime.timedelta(days=float(jd) - UNIX_EPOCH)
+
+
+def gmst(jd):
+    'Greenwich mean sidereal time in radians (IAU 1982), taking UT1 as UTC.'
+    t = (np.asarray(jd) - J2000) / 36525
+    seconds = 67310.54841 + t * (876600 * 3600 + 8640184.812866 + t * (0.093104 - 6.2e-6 * t))
+    return np.radians((seconds % 86400) / 240)
+
+
+def horizon(ra, dec, gst, lat, lon):
+    ''' Altitude and azimuth (radians) of right ascension and declination of
+        date, at sidereal time `gst`, from places `lat`, `lon`, broadcasting.
+    '''
+    h = gst + lon - ra
+    east = -np.cos(dec) * np.sin(h)
+    north = np.sin(dec) * np.cos(lat) - np.cos(dec) * np.cos(h) * np.sin(lat)
+    up = np.sin(dec) * np.sin(lat) + np.cos(dec) * np.cos(h) * np.cos(lat)
+    return np.arctan2(up, np.hypot(east, north)), np.arctan2(east, north)
+
+
+def horizon_vectors(alt, azi):
+    'Unit vectors, shaped (3, ...), toward altitudes and azimuths in degrees: north, east, up.'
+    alt, azi = np.radians(alt), np.radians(azi)
+    return np.array([np.cos(alt) * np.cos(azi), np.cos(alt) * np.sin(azi), np.sin(alt)])
+
+
+def angle(u, v):
+    'Angle in degrees between unit vectors along axis 0, robust at small angles.'
+    return np.degrees(2 * np.arcsin(np.clip(np.sqrt(((u - v) ** 2).sum(axis=0)) / 2, 0, 1)))
+
+
+def teme_to_itrs(r, v, jd):
+    ''' Rotate TEME position and velocity, shaped (..., time, 3) in km and
+        km/s, into the Earth-fixed frame.
+    '''
+    theta = gmst(jd)
+    c, s = np.cos(theta), np.sin(theta)
+    x = c * r[..., 0] + s * r[..., 1]
+    y = -s * r[..., 0] + c * r[..., 1]
+    vx = c * v[..., 0] + s * v[..., 1] + EARTH_ROTATION * y
+    vy = -s * v[..., 0] + c * v[..., 1] - EARTH_ROTATION * x
+    return (np.stack([x, y, r[..., 2]], axis=-1),
+            np.stack([vx, vy, v[..., 2]], axis=-1))
+
+
+def observer_itrs(latitude, longitude, elevation):
+    'Earth-fixed position in km of a place given in degrees and meters.'
+    lat, lon = np.radians(latitude), np.radians(longitude)
+    e2 = FLATTENING * (2 - FLATTENING)
+    n = EARTH_RADIUS / np.sqrt(1 - e2 * np.sin(lat) ** 2)
+    h = elevation / 1000
+    return np.array([(n + h) * np.cos(lat) * np.cos(lon),
+                     (n + h) * np.cos(lat) * np.sin(lon),
+                     (n * (1 - e2) + h) * np.sin(lat)])
+
+
+def altaz(r, latitude, longitude, elevation):
+    ''' Altitude and azimuth in degrees, and range in km, of Earth-fixed
+        positions shaped (..., 3) seen from a place on the ground.
+    '''
+    lat, lon = np.radians(latitude), np.radians(longitude)
+    d = r - observer_itrs(latitude, longitude, elevation)
+    dx, dy, dz = d[..., 0], d[..., 1], d[..., 2]
+    east = -np.sin(lon) * dx + np.cos(lon) * dy
+    outward = np.cos(lon) * dx + np.sin(lon) * dy  # away from the axis, in the meridian
+    north = np.cos(lat) * dz - np.sin(lat) * outward
+    up = np.sin(lat) * dz + np.cos(lat) * outward
+    horizontal = np.hypot(east, north)
+    return (np.degrees(np.arctan2(up, horizontal)),
+            np.degrees(np.arctan2(east, north)) % 360,
+            np.hypot(horizontal, up))
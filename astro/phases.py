@@ -0,0 +1,89 @@
+''' New Moon, First Quarter, Full Moon and Last Quarter, for decades at once.
+
+    The Moon's elongation from the Sun, measured along the ecliptic, is
+    computed for a whole grid of days in one call. Every time it passes a
+    multiple of 90° is then refined by bisection, all of them together.
+    Results are cached on disk, since they never change.
+
+        python -m astro.phases 2015 2025
+'''
+import argparse
+import datetime
+import os
+from collections import namedtuple
+import numpy as np
+from skyfield.timelib import JulianDate
+from . import CACHE_DIR
+from . import search
+from .ephemeris import apparent_sun, load
+from .events import year, utc_datetime
+
+Phase = namedtuple('Phase', 'tt name')
+NAMES = ('New Moon', 'First Quarter', 'Full Moon', 'Last Quarter')
+
+STEP = 1.0  # days; the elongation grows about 12° a day
+OBLIQUITY = np.radians(23.4392911)  # J2000
+
+
+def ecliptic_longitude(position):
+    'Longitude in degrees of (3, n) equatorial vectors on the J2000 ecliptic.'
+    x, y, z = position
+    return np.degrees(np.arctan2(y * np.cos(OBLIQUITY) + z * np.sin(OBLIQUITY), x)) % 360
+
+
+def elongation(t):
+    'Apparent geocentric longitude of the Moon minus that of the Sun, 0 to 360°, at TT dates.'
+    bodies = load()
+    here = bodies['earth'](JulianDate(tt=np.asarray(t, dtype=float)))
+    moon = ecliptic_longitude(here.observe(bodies['moon']).apparent().position.AU)
+    sun = ecliptic_longitude(apparent_sun(here).position.AU)
+    return (moon - sun) % 360
+
+
+def find_phases(start, end, step=STEP):
+    'TT dates and phase numbers (0 for New Moon up to 3) between two TT dates.'
+    t = np.arange(start, end + step, step)
+    quarter = (elongation(t) // 90).astype(int)
+    i = np.flatnonzero(quarter[1:] != quarter[:-1])
+    target = quarter[i + 1] * 90
+
+    def f(x):
+        # Signed distance past the target angle, good within 180° of it.
+        return (elongation(x) - target + 180) % 360 - 180
+
+    # About a second, starting from a bracket of `step` days.
+    iterations = int(np.ceil(np.log2(step * 86400)))
+    found = search.bisect(f, t[i], t[i + 1], iterations)
+    keep = (found >= start) & (found < end)
+    return found[keep], quarter[i + 1][keep]
+
+
+def phases(first_year, last_year, cache_dir=CACHE_DIR):
+    'Every phase from the start of `first_year` to the end of `last_year`, UTC.'
+    path = os.path.join(cache_dir, 'phases_{}_{}.npz'.format(first_year, last_year))
+    try:
+        with np.load(path) as data:
+            tt, quarter = data['tt'], data['quarter']
+    except (OSError, KeyError, ValueError):
+        tt, quarter = find_phases(year(first_year)[0], year(last_year)[1])
+        os.makedirs(cache_dir, exist_ok=True)
+        temporary = path + '.tmp.npz'
+        np.savez(temporary, tt=tt, quarter=quarter)
+        os.replace(temporary, path)
+    return [Phase(x, NAMES[q]) for x, q in zip(tt, quarter)]
+
+
+def new_moons(first_year, last_year):
+    'TT dates of every New Moon.'
+    return [p.tt for p in phases(first_year, last_year) if p.name == NAMES[0]]
+
+
+if __name__ == '__main__':
+    from . import timezone
+    this_year = datetime.date.today().year
+    parser = argparse.ArgumentParser(description='Phases of the Moon.')
+    parser.add_argument('first', type=int, nargs='?', default=this_year)
+    parser.add_argument('last', type=int, nargs='?')
+    args = parser.parse_args()
+    for p in phases(args.first, args.last or args.first):
+        print('{:%Y-%m-%d %H:%M %Z}  {}'.format(utc_datetime(p.tt).astimezone(timezone), p.name))
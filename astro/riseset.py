@@ -0,0 +1,153 @@
+''' Rising, transit and setting for many bodies at once, on a process pool.
+
+    Each worker process loads the ephemeris once, when it starts, and then
+    takes batches: solar system bodies by name, searched as in astro.events,
+    and slices of a star catalog. Stars hardly move in a day, so a whole
+    slice is done with array arithmetic from one apparent place per star.
+    Results come back batch by batch, as each one finishes.
+
+        python -m astro.riseset --days 1 --magnitude 6.5
+'''
+import argparse
+import datetime
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from skyfield.timelib import JulianDate
+from . import LATITUDE, LONGITUDE, ELEVATION
+from . import geometry
+from .ephemeris import load
+from .events import Event, HORIZON, MOON_HORIZON, SUN_HORIZON, find_events, tt
+from .stars import StarCatalog
+from .visibility import SIDEREAL_RATE
+
+CHUNK = 500  # stars per batch
+HORIZONS = {'sun': SUN_HORIZON, 'moon': MOON_HORIZON}
+KINDS = ('rise', 'transit', 'set', 'always up', 'never up')
+
+# Set in each worker process by `warm`.
+bodies = None
+observers = {}
+
+
+def warm():
+    'Load the ephemeris, once per worker process.'
+    global bodies
+    bodies = load()
+    bodies.update((planet.jplname, planet) for planet in bodies['nine_planets'])
+
+
+def observer(site):
+    'The topos for (latitude, longitude, elevation), made once per worker.'
+    if site not in observers:
+        latitude, longitude, elevation = site
+        observers[site] = bodies['earth'].topos(latitude_degrees=latitude, longitude_degrees=longitude,
+                                                elevation_m=elevation)
+    return observers[site]
+
+
+def body_events(names, start, end, site):
+    'Events between two TT dates for solar system bodies, by skyfield name.'
+    found = []
+    for name in names:
+        events = find_events(bodies[name], name.capitalize(), start, end,
+                             HORIZONS.get(name, HORIZON), observer(site))
+        found += [e for e in events if e.kind in KINDS]
+    return found
+
+
+def star_events(names, ra_hours, dec_degrees, start, end, site, horizon=HORIZON):
+    ''' Events between two TT dates for stars, from their apparent places
+        in the middle of the period, which is good to a few seconds of time
+        for periods up to a year or so.
+    '''
+    catalog = StarCatalog(names, ra_hours, dec_degrees, np.zeros(len(names)))
+    jd = JulianDate(tt=np.array([start, (start + end) / 2]))
+    ut1 = jd.ut1[0]
+    ra, dec = catalog.radec(JulianDate(tt=jd.tt[1]), observer(site))
+    lat, lon = np.radians(site[0]), np.radians(site[1])
+    rate = 2 * np.pi * SIDEREAL_RATE  # radians of hour angle per day
+
+    # Every upper transit from just before `start` to just after `end`.
+    first = start + ((ra - geometry.gmst(ut1) - lon) % (2 * np.pi)) / rate
+    transit = first[:, None] + np.arange(-1, (end - start) * SIDEREAL_RATE + 2) / SIDEREAL_RATE
+    with np.errstate(invalid='ignore'):
+        cos_h0 = (np.sin(np.radians(horizon)) - np.sin(lat) * np.sin(dec)) / (np.cos(lat) * np.cos(dec))
+        h0 = np.arccos(cos_h0)[:, None] / rate
+
+    found = []
+    for kind, t in ('rise', transit - h0), ('transit', transit), ('set', transit + h0):
+        star, k = np.nonzero((t >= start) & (t < end))
+        t = t[star, k]
+        gst = geometry.gmst(t - (start - ut1))
+        alt, azi = geometry.horizon(ra[star], dec[star], gst, lat, lon)
+        found += [Event(*row) for row in zip(t.tolist(), catalog.names[star].tolist(), [kind] * len(t),
+                                             np.degrees(alt).tolist(),
+                                             (np.degrees(azi) % 360).tolist())]
+
+    # Like `events.circumpolar`, at the start of each whole day.
+    for d in range(int(end - start)):
+        for kind, which in ('always up', cos_h0 < -1), ('never up', cos_h0 > 1):
+            found += [Event(start + d, str(name), kind, np.nan, np.nan) for name in catalog.names[which]]
+    return found
+
+
+class RiseTransitSet:
+    ''' A pool of worker processes, each with the ephemeris loaded, for
+        finding rise, transit and set times from one place.
+
+            with RiseTransitSet() as service:
+                for events in service.stream(start, end, ['mars'], catalog):
+                    ...
+    '''
+    def __init__(self, workers=None, latitude=LATITUDE, longitude=LONGITUDE, elevation=ELEVATION):
+        self.site = (latitude, longitude, elevation)
+        self.pool = ProcessPoolExecutor(workers, initializer=warm)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.pool.shutdown()
+
+    def stream(self, start, end, names=(), catalog=None, chunk=CHUNK):
+        ''' Yield lists of events between two TT dates, as each batch
+            finishes, for solar system bodies by skyfield name ('sun',
+            'moon', 'mars'...), one per batch, and `catalog`, a `StarCatalog`,
+            `chunk` stars per batch.
+        '''
+        jobs = [self.pool.submit(body_events, [name], start, end, self.site) for name in names]
+        if catalog is not None:
+            ra_hours, dec_degrees = catalog.star.ra._hours, catalog.star.dec._degrees
+            for i in range(0, len(catalog), chunk):
+                s = slice(i, i + chunk)
+                jobs.append(self.pool.submit(star_events, catalog.names[s], ra_hours[s], dec_degrees[s],
+                                             start, end, self.site))
+        for job in as_completed(jobs):
+            yield job.result()
+
+    def events(self, start, end, names=(), catalog=None, chunk=CHUNK):
+        'All the events from `stream`, in time order.'
+        found = [e for batch in self.stream(start, end, names, catalog, chunk) for e in batch]
+        found.sort()
+        return found
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Rise, transit and set for planets and stars.')
+    parser.add_argument('--days', type=float, default=1)
+    parser.add_argument('--magnitude', type=float, default=6.5, help='faintest star')
+    parser.add_argument('--workers', type=int, help='number of processes')
+    args = parser.parse_args()
+    start = tt(datetime.datetime.now(datetime.timezone.utc))
+    planets = ['sun', 'moon', 'mercury', 'venus', 'mars', 'jupiter', 'saturn', 'uranus', 'neptune', 'pluto']
+    began = time.perf_counter()
+    with RiseTransitSet(args.workers) as service:
+        count = 0
+        for batch in service.stream(start, start + args.days, planets,
+                                    StarCatalog.load(max_magnitude=args.magnitude)):
+            count += len(batch)
+    print('{} events in {:.1f} s'.format(count, time.perf_counter() - began))
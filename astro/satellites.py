@@ -1,39 +1,328 @@
 ''' Retrieve the latest two-line elements for satellites that interest us.'''
 import argparse
-import requests
-from skyfield.api import earth, now
-from . import home
+import datetime
+import json
+import os
+import tempfile
+from collections import namedtuple
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from sgp4.api import Satrec, SatrecArray
+from . import LATITUDE, LONGITUDE, ELEVATION
+from . import geometry, search
+from .ephemeris import load
 
+TLE_FILE = 'visual.txt'
+URL = 'http://celestrak.com/NORAD/elements/visual.txt'
 
-def retrieve():
-    r = requests.get('http://celestrak.com/NORAD/elements/visual.txt')
+
+def epochs(filename):
+    'Map each satellite name in a two-line element file to the epoch of its elements.'
+    result = {}
+    try:
+        with open(filename, 'rb') as f:
+            lines = [line.decode('ascii').strip() for line in f]
+    except OSError:
+        return result
+    for name, line1, line2 in zip(*[iter(lines)] * 3):
+        result[name] = line1[18:32].strip()
+    return result
+
+
+def check_elements(data, source='elements'):
+    ''' ValueError unless `data`, bytes, is nothing but name, line 1 and
+        line 2 triples, as `TLEStore` expects, rather than an error page.
+    '''
+    try:
+        lines = data.decode('ascii').splitlines()
+    except UnicodeDecodeError:
+        raise ValueError('{} is not two-line elements: not ASCII'.format(source)) from None
+    if not lines or len(lines) % 3:
+        raise ValueError('{} is not two-line elements: {} lines'.format(source, len(lines)))
+    for n in range(0, len(lines), 3):
+        line1, line2 = lines[n + 1], lines[n + 2]
+        number = line1[2:7]  # NORAD catalog number, on both lines
+        if line1[:2] != '1 ' or line2[:2] != '2 ' or not number.strip().isdigit() or line2[2:7] != number:
+            raise ValueError('{} is not two-line elements at line {}'.format(source, n + 2))
+
+
+def retrieve(url=URL, filename=TLE_FILE):
+    ''' Download the elements if they have changed since the last time.
+        The server is asked for them only if its ETag or Last-Modified has
+        changed, and the new file replaces the old one in a single rename,
+        only if it looks like elements; if not, ValueError.
+        Returns a dict of the satellites whose element epochs changed, name
+        to (old epoch, new epoch) with None for added or removed ones, and
+        appends the same to a log file beside the elements.
+    '''
+    state_filename = filename + '.http.json'
+    try:
+        with open(state_filename) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        state = {}
+    headers = {'Accept-Encoding': 'gzip, deflate'}
+    if os.path.exists(filename):
+        if state.get('etag'):
+            headers['If-None-Match'] = state['etag']
+        if state.get('last_modified'):
+            headers['If-Modified-Since'] = state['last_modified']
+
+    import requests
+    r = requests.get(url, headers=headers)
+    if r.status_code == 304:
+        return {}
     r.raise_for_status()
-    with open('visual.txt', 'wb') as f:
+    check_elements(r.content, url)
+
+    directory = os.path.dirname(os.path.abspath(filename))
+    with tempfile.NamedTemporaryFile('wb', dir=directory, delete=False) as f:
         f.write(r.content)
+    try:
+        old, new = epochs(filename), epochs(f.name)
+        os.replace(f.name, filename)
+    finally:
+        if os.path.exists(f.name):
+            os.unlink(f.name)  # Only still there if something went wrong.
+
+    state = {'etag': r.headers.get('ETag'), 'last_modified': r.headers.get('Last-Modified')}
+    with open(state_filename, 'w') as f:
+        json.dump(state, f)
+
+    changes = {name: (old.get(name), new.get(name))
+               for name in sorted(set(old) | set(new)) if old.get(name) != new.get(name)}
+    if changes:
+        stamp = datetime.datetime.now(datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+        with open(filename + '.changes.log', 'a') as f:
+            for name, (before, after) in changes.items():
+                f.write('{} {} {} -> {}\n'.format(stamp, name, before, after))
+    return changes
+
+
+class TLEStore(Mapping):
+    ''' The satellites in a two-line element file, by name or by NORAD
+        catalog number. Only the offsets of the entries are read up front,
+        and those are kept in an index file beside the elements so they
+        don't have to be found again while the file is unchanged. A
+        satellite object is built the first time it is asked for.
+    '''
+    def __init__(self, filename=TLE_FILE):
+        self.filename = filename
+        self.index_filename = filename + '.index.json'
+        self.satellites = {}
+        self.offsets, self.catalog = self.load_index()
+
+    def signature(self):
+        st = os.stat(self.filename)
+        return [st.st_size, st.st_mtime_ns]
+
+    def load_index(self):
+        signature = self.signature()
+        try:
+            with open(self.index_filename) as f:
+                index = json.load(f)
+            if index['signature'] == signature:
+                return index['offsets'], {int(k): v for k, v in index['catalog'].items()}
+        except (OSError, ValueError, KeyError):
+            pass
+        offsets, catalog = self.scan()
+        index = {'signature': signature, 'offsets': offsets, 'catalog': catalog}
+        try:
+            with open(self.index_filename, 'w') as f:
+                json.dump(index, f)
+        except OSError:
+            pass  # Still usable, just not saved for next time.
+        return offsets, catalog
+
+    def scan(self):
+        'Find where each entry starts, without parsing any elements.'
+        offsets, catalog = {}, {}
+        with open(self.filename, 'rb') as f:
+            while True:
+                offset = f.tell()
+                name, line1 = f.readline(), f.readline()
+                if not f.readline():
+                    break
+                name = name.decode('ascii').strip()
+                offsets[name] = offset
+                catalog[int(line1[2:7])] = name
+        return offsets, catalog
+
+    def elements(self, names=None):
+        'Bare SGP4 element sets, for propagating many satellites together.'
+        names = list(self) if names is None else names
+        return [Satrec.twoline2rv(*self.lines(name)[1:]) for name in names]
+
+    def lines(self, name):
+        with open(self.filename, 'rb') as f:
+            f.seek(self.offsets[name])
+            return [f.readline().decode('ascii').strip() for _ in range(3)]
+
+    def __getitem__(self, key):
+        name = self.catalog[key] if isinstance(key, int) else key
+        if name not in self.satellites:
+            if name not in self.offsets:
+                raise KeyError(key)
+            self.satellites[name] = load()['earth'].satellite('{}\n{}\n{}\n'.format(*self.lines(name)))
+        return self.satellites[name]
+
+    def __iter__(self):
+        return iter(self.offsets)
+
+    def __len__(self):
+        return len(self.offsets)
+
+
+def get_satellites(filename=TLE_FILE):
+    return TLEStore(filename)
+
+
+class Constellation:
+    ''' Many satellites propagated together. Times are arrays of UTC Julian
+        dates (see `geometry.julian_date`), and results are shaped
+        (satellite, time, ...).
+    '''
+    def __init__(self, store=None, names=None):
+        store = store if store is not None else get_satellites()
+        self.names = list(store) if names is None else list(names)
+        self.satrecs = store.elements(self.names)
+        self.array = SatrecArray(self.satrecs)
+
+    def propagate(self, jd):
+        ''' SGP4 error codes, and TEME position (km) and velocity (km/s).
+            Positions where the error code isn't zero are NaN.
+        '''
+        jd = np.atleast_1d(np.asarray(jd, dtype=float))
+        whole = np.floor(jd)
+        error, r, v = self.array.sgp4(whole, jd - whole)
+        r[error != 0] = np.nan
+        v[error != 0] = np.nan
+        return error, r, v
+
+    def altaz(self, jd, latitude=LATITUDE, longitude=LONGITUDE, elevation=ELEVATION):
+        'Altitude, azimuth (degrees) and range (km) of every satellite from home.'
+        _, r, v = self.propagate(jd)
+        r, v = geometry.teme_to_itrs(r, v, np.atleast_1d(jd))
+        return geometry.altaz(r, latitude, longitude, elevation)
+
+    def single_altaz(self, i, jd, latitude=LATITUDE, longitude=LONGITUDE, elevation=ELEVATION):
+        'Altitude, azimuth and range of satellite number `i` alone, at an array of times.'
+        jd = np.atleast_1d(np.asarray(jd, dtype=float))
+        whole = np.floor(jd)
+        error, r, v = self.satrecs[i].sgp4_array(whole, jd - whole)
+        r[error != 0] = np.nan
+        r, v = geometry.teme_to_itrs(r, v, jd)
+        return geometry.altaz(r, latitude, longitude, elevation)
+
+    def altitude(self, i, jd, latitude=LATITUDE, longitude=LONGITUDE, elevation=ELEVATION):
+        'Altitude in degrees of satellite number `i` alone, at an array of times.'
+        return self.single_altaz(i, jd, latitude, longitude, elevation)[0]
+
+
+Pass = namedtuple('Pass', 'name rise culmination set altitude')
+STEP = 60  # seconds between coarse altitude samples when looking for passes
+CHUNK = 50  # satellites per worker task
+
+
+def find_passes(constellation, start, days, horizon=0.0, step=STEP):
+    ''' Every pass of every satellite over `days` from the Julian date `start`.
+        Altitudes are sampled every `step` seconds for all satellites at
+        once; horizon crossings and peaks are then refined by bisection.
+        Times are UTC Julian dates, and a pass already under way at the
+        start, or not over by the end, has None for its rise or set.
+        Passes shorter than `step` can be missed.
+    '''
+    jd = start + np.arange(0, days * 86400 + step, step) / 86400
+    alt, _, _ = constellation.altaz(jd)
+    up = alt > horizon  # NaN, from a decayed orbit, counts as down.
+    dt = step / 86400
+    passes = []
+    for i, name in enumerate(constellation.names):
+        def f(t):
+            return constellation.altitude(i, t) - horizon
+        change = np.diff(up[i].astype(np.int8))
+        rises = np.flatnonzero(change == 1)
+        sets = np.flatnonzero(change == -1)
+        rise_times = search.bisect(f, jd[rises], jd[rises + 1])
+        set_times = search.bisect(f, jd[sets], jd[sets + 1])
+
+        # Pair each rise with the following set, allowing for a satellite
+        # that is already up at the start or still up at the end.
+        already_up = [None] if up[i, 0] else []
+        still_up = [None] if up[i, -1] else []
+        rise_list = already_up + list(zip(rises, rise_times))
+        set_list = list(zip(sets, set_times)) + still_up
+        if not rise_list:
+            continue
+        # Start the peak search from the best coarse sample in each pass.
+        lo, hi = [], []
+        for r, s in zip(rise_list, set_list):
+            first = r[0] if r else 0
+            last = s[0] + 1 if s else len(jd) - 1
+            k = first + np.nanargmax(alt[i, first:last + 1])
+            lo.append(max(jd[k] - dt, jd[first]))
+            hi.append(min(jd[k] + dt, jd[last]))
+        peak = search.maximum(lambda t: constellation.altitude(i, t), lo, hi)
+        peak_alt = constellation.altitude(i, peak)
+        for r, s, p, a in zip(rise_list, set_list, peak, peak_alt):
+            passes.append(Pass(name, r[1] if r else None, p, s[1] if s else None, a))
+    return passes
+
+
+def chunk_passes(filename, names, start, days, horizon, step):
+    'One worker\'s share of `all_passes`.'
+    return find_passes(Constellation(get_satellites(filename), names), start, days, horizon, step)
+
+
+def all_passes(days, start=None, names=None, horizon=0.0, step=STEP,
+               filename=TLE_FILE, workers=None):
+    ''' Yield the passes of every satellite in the file, or just `names`,
+        as each worker process finishes its share of the satellites.
+    '''
+    if start is None:
+        start = geometry.julian_date(datetime.datetime.now(datetime.timezone.utc))
+    names = list(get_satellites(filename)) if names is None else list(names)
+    with ProcessPoolExecutor(workers) as pool:
+        jobs = [pool.submit(chunk_passes, filename, names[i:i + CHUNK], start, days, horizon, step)
+                for i in range(0, len(names), CHUNK)]
+        for job in as_completed(jobs):
+            yield from job.result()
 
 
-def get_satellites():
-    satellites = {}
-    with open('visual.txt') as f:
-        lines = [line.strip() for line in f]
-        args = [iter(lines)] * 3
-        for name, line1, line2 in zip(*args):
-            satellites[name] = earth.satellite('{}\n{}\n{}\n'.format(name, line1, line2))
-    return satellites
+def local_time(jd):
+    from . import timezone
+    if jd is None:
+        return '{:^14}'.format('-')
+    return '{:%a %H:%M:%S}'.format(geometry.datetime_from_julian(jd).astimezone(timezone))
 
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Earth satellite retrieval.')
+    parser.add_argument('command', nargs='?', choices=['passes'])
     parser.add_argument('--retrieve', action='store_true')
+    parser.add_argument('--days', type=float, default=1, help='how far ahead to find passes')
+    parser.add_argument('--horizon', type=float, default=0, help='minimum altitude, degrees')
+    parser.add_argument('--workers', type=int, help='number of processes')
     args = parser.parse_args()
-    if args.retrieve:
+    if args.command == 'passes':
+        passes = list(all_passes(args.days, horizon=args.horizon, workers=args.workers))
+        for p in sorted(passes, key=lambda p: p.culmination):
+            print('{:24s} {} {} {:3.0f}° {}'.format(
+                p.name, local_time(p.rise), local_time(p.culmination), p.altitude, local_time(p.set)))
+    elif args.retrieve:
         print('Retrieving satellite elements.')
-        #retrieve()
+        changes = retrieve()
+        for name, (before, after) in changes.items():
+            print('{:24s} {} -> {}'.format(name, before, after))
+        print(len(changes), 'satellites changed.')
     else:
         satellites = get_satellites()
         print(len(satellites), 'visual satellites.')
-        for name, sat in satellites.items():
+        for name in satellites:
             if name.startswith('ISS'):
-                position = home(now()).observe(sat).altaz()
+                from skyfield.timelib import now
+                from . import home
+                position = home(now()).observe(satellites[name]).altaz()
                 print(position)
                 break
@@ -0,0 +1,201 @@
+''' Deliver rise, transit, set, twilight and satellite pass events as
+    they happen, to any number of asyncio subscribers.
+
+    Events are worked out ahead of time, a batch of bodies and a stretch of
+    days at a time, on an executor so the event loop stays free, and kept
+    in a heap. The loop sleeps until exactly the next event, or until a new
+    batch arrives with something earlier.
+
+        python -m astro.scheduler --satellite 'ISS (ZARYA)'
+
+    replaces obsolete/toys/watcher.py.
+'''
+import argparse
+import asyncio
+import datetime
+import heapq
+import numpy as np
+from . import home
+from . import geometry
+from .events import Event, HORIZON, MOON_HORIZON, find_events, sun_events, tt, utc_datetime
+from .ephemeris import load
+from .satellites import TLE_FILE, Constellation, find_passes, get_satellites
+
+LOOKAHEAD = 1.0  # days of events computed in each batch
+CHUNK = 50  # bodies per executor job
+PASS_MARGIN = 1 / 24  # days, longer than a pass in low orbit
+
+
+def now():
+    'The current TT Julian date.'
+    return tt(datetime.datetime.now(datetime.timezone.utc))
+
+
+def default_bodies():
+    'The Sun, Moon and planets, as (name, body, horizon).'
+    bodies = load()
+    found = [('Sun', bodies['sun'], None), ('Moon', bodies['moon'], MOON_HORIZON)]
+    for planet in bodies['nine_planets']:
+        if planet != bodies['earth']:
+            found.append((planet.jplname.capitalize(), planet, HORIZON))
+    return found
+
+
+def body_events(bodies, start, end, observer=home):
+    ''' Events between two TT dates for (name, body, horizon) triples. A
+        horizon of None means the Sun, with every kind of twilight.
+    '''
+    found = []
+    for name, body, horizon in bodies:
+        if horizon is None:
+            found += sun_events(start, end, observer)
+        else:
+            found += find_events(body, name, start, end, horizon, observer)
+    return found
+
+
+def satellite_events(names, start, end, filename=TLE_FILE, horizon=0.0):
+    'Rise, culmination and set of each pass of the named satellites, as events.'
+    offset = start - geometry.julian_date(utc_datetime(start))  # TT - UTC
+    constellation = Constellation(get_satellites(filename), names)
+    times = {}
+    # Passes are looked for a margin either side, so that one cut off at the
+    # edge of the search, whose peak is then at the cut, is cut outside the
+    # batch; only what happens from `start` up to `end` is kept.
+    first, last = start - offset - PASS_MARGIN, end - offset + PASS_MARGIN
+    for p in find_passes(constellation, first, last - first, horizon):
+        for t, kind in (p.rise, 'rise'), (p.culmination, 'culmination'), (p.set, 'set'):
+            if t is not None and start <= t + offset < end:
+                times.setdefault(p.name, []).append((t, kind))
+    found = []
+    for name, pairs in times.items():
+        jd = np.array([t for t, kind in pairs])
+        alt, azi, _ = constellation.single_altaz(constellation.names.index(name), jd)
+        found += [Event(t + offset, name, kind, a, z) for (t, kind), a, z in zip(pairs, alt, azi)]
+    return found
+
+
+def batch(bodies, satellites, start, end, filename=TLE_FILE, observer=home):
+    'Events for some bodies and satellites between two TT dates, for an executor.'
+    found = body_events(bodies, start, end, observer)
+    if satellites:
+        found += satellite_events(satellites, start, end, filename)
+    return [e for e in found if start <= e.tt < end]
+
+
+class Scheduler:
+    ''' Keeps `lookahead` days of events ahead of the clock for `bodies`,
+        a list of (name, body, horizon), and the named `satellites`, and
+        hands each one to every subscriber when it happens. Batches are
+        computed on `executor`, by default the event loop's own; pass a
+        `ProcessPoolExecutor` for thousands of objects.
+    '''
+    def __init__(self, bodies=None, satellites=(), observer=home, filename=TLE_FILE,
+                 lookahead=LOOKAHEAD, executor=None):
+        self.bodies = default_bodies() if bodies is None else list(bodies)
+        self.satellites = list(satellites)
+        self.observer = observer
+        self.filename = filename
+        self.lookahead = lookahead
+        self.executor = executor
+        self.heap = []
+        self.subscribers = set()
+        self.until = None  # events are known up to this TT date
+        self.pending = None  # the batch being computed, if any
+        self.error = None  # from a batch that failed, raised by `run`
+        self.wake = asyncio.Event()
+
+    async def compute(self, start, end, bodies=None, satellites=None):
+        ''' Work out events between two TT dates, in jobs of `CHUNK` objects
+            run on the executor, and add them to the heap.
+        '''
+        bodies = self.bodies if bodies is None else bodies
+        satellites = self.satellites if satellites is None else satellites
+        loop = asyncio.get_running_loop()
+        jobs = [loop.run_in_executor(self.executor, batch, bodies[i:i + CHUNK], [], start, end,
+                                     self.filename, self.observer)
+                for i in range(0, len(bodies), CHUNK)]
+        jobs += [loop.run_in_executor(self.executor, batch, [], satellites[i:i + CHUNK], start, end,
+                                      self.filename, self.observer)
+                 for i in range(0, len(satellites), CHUNK)]
+        for job in asyncio.as_completed(jobs):
+            for event in await job:
+                heapq.heappush(self.heap, event)
+            self.wake.set()
+
+    def extend(self):
+        'Start on the next batch once the known events start running out.'
+        if self.pending is None and self.until - now() < self.lookahead / 2:
+            start, self.until = self.until, self.until + self.lookahead
+            self.pending = asyncio.ensure_future(self.compute(start, self.until))
+            self.pending.add_done_callback(self.finished)
+
+    def finished(self, future):
+        self.pending = None
+        if not future.cancelled():
+            self.error = future.exception()
+        self.wake.set()
+
+    async def add(self, name, body, horizon=HORIZON):
+        'Start following another body, from now.'
+        self.bodies.append((name, body, horizon))
+        if self.until is not None:
+            await self.compute(now(), self.until, bodies=[(name, body, horizon)], satellites=[])
+
+    async def subscribe(self):
+        'Yield each event as it happens, for as long as the caller keeps iterating.'
+        queue = asyncio.Queue()
+        self.subscribers.add(queue)
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            self.subscribers.discard(queue)
+
+    async def run(self):
+        'Deliver events forever. The first batch is computed before starting.'
+        start = now()
+        self.until = start + self.lookahead
+        await self.compute(start, self.until)
+        while True:
+            self.wake.clear()
+            if self.error is not None:
+                raise self.error
+            self.extend()
+            t = now()
+            while self.heap and self.heap[0].tt <= t:
+                event = heapq.heappop(self.heap)
+                for queue in self.subscribers:
+                    queue.put_nowait(event)
+            # Wake for the next event, or when it is time for the next batch.
+            deadlines = [self.heap[0].tt] if self.heap else []
+            if self.pending is None:
+                deadlines.append(self.until - self.lookahead / 2)
+            delay = max(0.0, (min(deadlines) - t) * 86400) if deadlines else None
+            try:
+                await asyncio.wait_for(self.wake.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+
+async def show(scheduler):
+    from . import timezone
+    async for e in scheduler.subscribe():
+        print('{:%a %H:%M:%S} {:24s} {:18s} {:5.1f}° at {:05.1f}°'.format(
+            utc_datetime(e.tt).astimezone(timezone), e.name, e.kind, e.alt, e.azi), flush=True)
+
+
+async def main(satellites, lookahead):
+    scheduler = Scheduler(satellites=satellites, lookahead=lookahead)
+    await asyncio.gather(scheduler.run(), show(scheduler))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Print rise, set, transit and twilight as they happen.')
+    parser.add_argument('--satellite', action='append', default=[], help='name in the element file')
+    parser.add_argument('--lookahead', type=float, default=LOOKAHEAD, help='days per batch')
+    args = parser.parse_args()
+    try:
+        asyncio.run(main(args.satellite, args.lookahead))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,38 @@
+''' Vectorized root and extremum refinement.
+
+    A coarse grid finds the brackets; these then narrow every bracket at
+    once, calling `f` on a whole array of times per step instead of
+    searching for one event at a time.
+'''
+import numpy as np
+
+
+def bisect(f, lo, hi, iterations=20):
+    ''' Narrow each [lo, hi] bracket of a sign change of `f`, where `f`
+        maps an array of times to an array of values. Returns the midpoints
+        of the final brackets.
+    '''
+    lo, hi = np.array(lo, dtype=float), np.array(hi, dtype=float)
+    if lo.size == 0:
+        return lo
+    below = np.asarray(f(lo)) > 0
+    for _ in range(iterations):
+        mid = (lo + hi) / 2
+        same = (np.asarray(f(mid)) > 0) == below
+        lo = np.where(same, mid, lo)
+        hi = np.where(same, hi, mid)
+    return (lo + hi) / 2
+
+
+def maximum(f, lo, hi, iterations=20, delta=1e-6):
+    ''' Find the maximum of `f` inside each [lo, hi], assuming one peak,
+        by bisecting on the sign of its slope.
+    '''
+    def slope(t):
+        return f(t - delta) - f(t + delta)
+    return bisect(slope, lo, hi, iterations)
+
+
+def minimum(f, lo, hi, iterations=20, delta=1e-6):
+    'As `maximum`, for a single dip.'
+    return maximum(lambda t: -np.asarray(f(t)), lo, hi, iterations, delta)
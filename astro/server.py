@@ -0,0 +1,157 @@
+''' Keep everything loaded in one long-running process and answer queries
+    over a Unix domain socket.
+
+        python -m astro --serve
+
+    The protocol is one JSON object per line each way. A request names an
+    operation, for example
+
+        {"op": "positions", "utc": "2015-06-21T12:00:00+00:00", "names": ["Moon"]}
+
+    and the reply is {"ok": true, "result": ...} or {"ok": false, "error": "..."}.
+    Operations:
+
+        ping        -> "pong"
+        positions   -> [[name, alt, azi, symbol], ...]   utc and names optional,
+                       alt and azi null where they could not be worked out
+        satellites  -> names in the two-line element file
+'''
+import datetime
+import json
+import math
+import os
+import socket
+import socketserver
+import tempfile
+import threading
+import time
+
+SOCKET = os.environ.get('ASTRO_SOCKET') or os.path.join(
+    os.environ.get('XDG_RUNTIME_DIR', tempfile.gettempdir()), 'astro.sock')
+
+
+def parse_utc(text):
+    if text is None:
+        return datetime.datetime.now(datetime.timezone.utc)
+    dt = datetime.datetime.fromisoformat(text)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=datetime.timezone.utc)
+    return dt
+
+
+def today():
+    return datetime.datetime.now(datetime.timezone.utc).date()
+
+
+def number(x):
+    'A float for JSON, which has no NaN, so None for one.'
+    x = float(x)
+    return None if math.isnan(x) else x
+
+
+class Sky:
+    ''' The warm state: ephemeris, observer and satellites, loaded once.
+        Positions come from the day's Chebyshev fits, see astro/cache.py.
+        Today is fitted before serving, and each next day in the background
+        before it starts, so a query never waits for a fit.
+    '''
+    def __init__(self):
+        from .cache import ChebyshevCache
+        from .sky import SkySnapshot
+        from .satellites import get_satellites
+        self.snapshot = SkySnapshot()
+        self.cache = ChebyshevCache(self.snapshot)
+        self.cache.day(today())
+        self.satellites = get_satellites()
+        self.lock = threading.Lock()
+        # Its own snapshot, so fitting never shares skyfield objects with a query.
+        self.ahead = ChebyshevCache(SkySnapshot(), maxsize=1)
+        threading.Thread(target=self.fit_ahead, daemon=True).start()
+
+    def fit_ahead(self):
+        'Forever fit tomorrow, then sleep until it is today.'
+        while True:
+            tomorrow = today() + datetime.timedelta(days=1)
+            day = self.ahead.day(tomorrow)
+            with self.lock:
+                self.cache.add(tomorrow, day)
+            midnight = datetime.datetime.combine(tomorrow, datetime.time(tzinfo=datetime.timezone.utc))
+            time.sleep(max(0, (midnight - datetime.datetime.now(datetime.timezone.utc)).total_seconds()))
+
+    def ping(self):
+        return 'pong'
+
+    def positions(self, utc=None, names=None):
+        with self.lock:
+            positions = self.cache.positions(parse_utc(utc), names)
+        return [[p.name, number(p.alt), number(p.azi), p.symbol] for p in positions]
+
+    def list_satellites(self):
+        return list(self.satellites)
+
+    def handle(self, request):
+        op = request.pop('op', None)
+        if op == 'ping':
+            return self.ping()
+        if op == 'positions':
+            return self.positions(**request)
+        if op == 'satellites':
+            return self.list_satellites()
+        raise ValueError('Unknown operation: {!r}'.format(op))
+
+
+class Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                reply = {'ok': True, 'result': self.server.sky.handle(json.loads(line))}
+            except Exception as e:
+                reply = {'ok': False, 'error': '{}: {}'.format(type(e).__name__, e)}
+            self.wfile.write(json.dumps(reply).encode('utf-8') + b'\n')
+            self.wfile.flush()
+
+
+class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve(path=SOCKET):
+    'Load everything, then answer queries on the socket until interrupted.'
+    if os.path.exists(path):
+        try:
+            query({'op': 'ping'}, path)
+        except OSError:
+            os.unlink(path)  # Left behind by a server that has gone.
+        except RuntimeError:
+            pass  # Something answered, so it's alive.
+    if os.path.exists(path):
+        raise RuntimeError('A server is already running on {}'.format(path))
+    sky = Sky()
+    with Server(path, Handler) as server:
+        server.sky = sky
+        print('Serving on', path)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.unlink(path)
+
+
+def query(request, path=SOCKET, timeout=5.0):
+    ''' Send one request to a running server and return its result.
+        Raises OSError when no server is listening, and RuntimeError when
+        the server reports an error.
+    '''
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.settimeout(timeout)
+        s.connect(path)
+        s.sendall(json.dumps(request).encode('utf-8') + b'\n')
+        with s.makefile('rb') as f:
+            line = f.readline()
+    if not line:
+        raise ConnectionError('No reply from {}'.format(path))
+    reply = json.loads(line)
+    if not reply['ok']:
+        raise RuntimeError(reply['error'])
+    return reply['result']
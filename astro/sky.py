@@ -0,0 +1,90 @@
+''' The whole sky as seen from home at one instant.
+
+    Every body is reduced against a single observer position, so the
+    observer's barycentric state, precession, nutation and Earth rotation
+    are only computed once per time instead of once per body. That is why
+    the rotation to the horizon is done here rather than by
+    `Apparent.altaz`, which works out sidereal time again for every body.
+'''
+from numpy import einsum
+from . import home, Position
+from . import timing
+from .ephemeris import load
+from .symbols import get_symbols
+from .satellites import get_satellites
+from .stars import StarCatalog, altaz, horizon
+
+# Stars from the catalog in astro.stars that are listed by default.
+STARS = ('Sirius', 'Vega')
+
+# Short display name and the name used in the two-line element file.
+SATELLITES = {
+    'ISS': 'ISS (ZARYA)',
+}
+
+
+class SkySnapshot:
+    ''' Set up once, then call `positions(jd)` as often as needed.
+        The satellite elements are loaded when the snapshot is created,
+        not on every call, from `store` or else the usual file. `stars` is
+        a `StarCatalog`, all of whose stars are observed together.
+    '''
+    def __init__(self, observer=home, stars=None, satellites=SATELLITES, store=None):
+        self.observer = observer
+        self.symbols = get_symbols()
+        with timing.stage('ephemeris'):
+            bodies = load()
+        self.bodies = [body for body in (bodies['sun'], bodies['moon']) + tuple(bodies['nine_planets'])
+                       if body != bodies['earth']]
+        self.stars = stars if stars is not None else StarCatalog.load(max_magnitude=None).select(STARS)
+        if satellites:
+            with timing.stage('satellites'):
+                elements = store if store is not None else get_satellites()
+                self.satellites = {name: elements[tle_name] for name, tle_name in satellites.items()}
+        else:
+            self.satellites = {}
+
+    def generate_positions(self, jd, names=None):
+        ''' Yield a `Position` for every body, all observed from the same place.
+            If `names` is given, only those bodies are computed.
+        '''
+        with timing.stage('home(jd)'):
+            here = self.observer(jd)
+            axes = horizon(jd, here.topos)
+
+        def wanted(name):
+            return names is None or name in names
+
+        def observe(name, body, apparent=True):
+            with timing.stage('observe', name):
+                position = here.observe(body)
+            if apparent:
+                with timing.stage('apparent', name):
+                    position = position.apparent()
+            with timing.stage('altaz', name):
+                return altaz(einsum('ij...,j...->i...', jd.M, position.position.AU), axes)
+
+        for body in self.bodies:
+            name = body.jplname.capitalize()
+            if wanted(name):
+                yield Position(name, *observe(name, body), self.symbols.get(name.upper(), ' '))
+
+        if any(wanted(name) for name in self.stars.names):
+            with timing.stage('observe', 'stars'):
+                alt, azi = self.stars.altaz(jd, self.observer, axes)
+            for name, a, z in zip(self.stars.names, alt, azi):
+                if wanted(name):
+                    yield Position(str(name), a, z, self.symbols['BLACK STAR'])
+
+        # Earth satellites are special.
+        for name, sat in self.satellites.items():
+            if wanted(name):
+                yield Position(name, *observe(name, sat, apparent=False), ' ')
+
+    def positions(self, jd, names=None):
+        return list(self.generate_positions(jd, names))
+
+    @property
+    def names(self):
+        bodies = [body.jplname.capitalize() for body in self.bodies]
+        return bodies + [str(name) for name in self.stars.names] + list(self.satellites)
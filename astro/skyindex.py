@@ -0,0 +1,148 @@
+''' A spatial index of stars on the sky, for "what is near X" questions.
+
+    Each star is a unit vector, held in a KD-tree. An angular radius θ on
+    the sky is a straight-line (chord) distance of 2 sin(θ/2) between unit
+    vectors, so a cone search is a plain ball query on the tree. The tree
+    is built once; each query only touches nearby stars.
+
+        python -m astro.skyindex 2015     # planets and the Moon near bright stars
+        python -m astro.skyindex --now    # pairs of things close together right now
+
+    The same index answers "every pair within θ" and "everything within θ
+    of X" for whatever is in the sky right now, without working out all
+    N² separations and throwing most of them away.
+'''
+import argparse
+import datetime
+from collections import namedtuple
+import numpy as np
+from scipy.spatial import cKDTree
+from .conjunctions import BODIES, directions
+from .events import year, utc_datetime
+from .geometry import angle, horizon_vectors
+from .stars import CATALOG
+
+Neighbor = namedtuple('Neighbor', 'name separation')
+Separation = namedtuple('Separation', 'name1 name2 separation')
+
+
+def unit_vectors(ra_hours, dec_degrees):
+    'Unit vectors, shaped (n, 3), for equatorial coordinates.'
+    ra, dec = np.radians(np.asarray(ra_hours) * 15), np.radians(dec_degrees)
+    return np.column_stack([np.cos(dec) * np.cos(ra), np.cos(dec) * np.sin(ra), np.sin(dec)])
+
+
+def chord(degrees):
+    return 2 * np.sin(np.radians(degrees) / 2)
+
+
+class SkyIndex:
+    ''' Named unit vectors in a KD-tree. Any without a position, such as a
+        satellite whose orbit has decayed, are left out.
+    '''
+    def __init__(self, names, vectors):
+        vectors = np.asarray(vectors, dtype=float)
+        known = np.isfinite(vectors).all(axis=1)
+        self.names = np.asarray(names)[known]
+        self.vectors = vectors[known]
+        self.rows = {str(name): i for i, name in enumerate(self.names)}
+        self.tree = cKDTree(self.vectors)
+
+    @classmethod
+    def from_catalog(cls, path=CATALOG, max_magnitude=None):
+        'The bright-star catalog from `astro.stars`.'
+        with np.load(path) as data:
+            keep = slice(None) if max_magnitude is None else data['magnitude'] <= max_magnitude
+            return cls(data['name'][keep], unit_vectors(data['ra_hours'][keep], data['dec_degrees'][keep]))
+
+    @classmethod
+    def from_positions(cls, positions):
+        'Anything with name, alt and azi, such as `Position` tuples.'
+        positions = list(positions)
+        return cls([p.name for p in positions],
+                   horizon_vectors([p.alt for p in positions], [p.azi for p in positions]).T)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __getitem__(self, name):
+        'The unit vector of a name.'
+        return self.vectors[self.rows[name]]
+
+    def pairs(self, radius):
+        'Every pair within `radius` degrees of each other, closest first.'
+        found = self.tree.query_pairs(chord(radius), output_type='ndarray')
+        i, j = found[:, 0], found[:, 1]
+        separation = angle(self.vectors[i].T, self.vectors[j].T)
+        return [Separation(str(self.names[i[k]]), str(self.names[j[k]]), separation[k])
+                for k in np.argsort(separation)]
+
+    def neighbors(self, name, radius):
+        'Everything else within `radius` degrees of `name`, closest first.'
+        return [n for n in self.near(self[name], radius) if n.name != name]
+
+    def near(self, vector, radius):
+        'Everything within `radius` degrees of a unit vector, closest first.'
+        vector = np.asarray(vector, dtype=float)
+        i = np.array(self.tree.query_ball_point(vector, chord(radius)), dtype=int)
+        separation = angle(self.vectors[i].T, vector[:, None])
+        order = np.argsort(separation)
+        return [Neighbor(str(self.names[i[k]]), separation[k]) for k in order]
+
+    def near_many(self, vectors, radius):
+        ''' Pairs of (row in `vectors`, index into this catalog) within
+            `radius` degrees of each other, with their separations. One
+            tree query covers every row.
+        '''
+        vectors = np.asarray(vectors, dtype=float)
+        matches = self.tree.query_ball_point(vectors, chord(radius))
+        rows = np.repeat(np.arange(len(vectors)), [len(m) for m in matches])
+        stars = np.fromiter((i for m in matches for i in m), dtype=int, count=len(rows))
+        separation = angle(vectors[rows].T, self.vectors[stars].T)
+        return rows, stars, separation
+
+
+def current_index(jd, snapshot=None, catalog=None):
+    ''' An index of everything in `snapshot` (a new `SkySnapshot` by
+        default), plus every star of a `StarCatalog` if one is given, as
+        seen from home at `jd`.
+    '''
+    from .sky import SkySnapshot
+    snapshot = snapshot if snapshot is not None else SkySnapshot()
+    positions = snapshot.positions(jd)
+    index = SkyIndex.from_positions(positions)
+    if catalog is None:
+        return index
+    alt, azi = catalog.altaz(jd, snapshot.observer)
+    return SkyIndex(np.concatenate([index.names, catalog.names]),
+                    np.concatenate([index.vectors, horizon_vectors(alt, azi).T]))
+
+
+def close_star_approaches(y, radius=3.0, index=None, names=BODIES):
+    ''' Each day of a year, the Moon and planets within `radius` degrees of
+        a catalog star. Yields (TT date, body, star, separation).
+    '''
+    index = index if index is not None else SkyIndex.from_catalog()
+    start, end = year(y)
+    t = np.arange(start, end)
+    u = directions(names, t)  # (body, xyz, day)
+    vectors = u.transpose(0, 2, 1).reshape(-1, 3)
+    rows, stars, separation = index.near_many(vectors, radius)
+    body, day = np.divmod(rows, len(t))
+    for k in np.lexsort((separation, day)):
+        yield t[day[k]], names[body[k]].capitalize(), str(index.names[stars[k]]), separation[k]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='The Moon and planets near bright stars.')
+    parser.add_argument('year', type=int, nargs='?', default=datetime.date.today().year)
+    parser.add_argument('--radius', type=float, default=3.0, help='degrees')
+    parser.add_argument('--now', action='store_true', help='pairs in the sky right now')
+    args = parser.parse_args()
+    if args.now:
+        from skyfield.timelib import now
+        for p in current_index(now()).pairs(args.radius):
+            print('{0.separation:6.2f}° {0.name1} ⇔ {0.name2}'.format(p))
+        raise SystemExit
+    for tt, body, star, separation in close_star_approaches(args.year, args.radius):
+        print('{:%Y-%m-%d} {:8s} {:12s} {:5.2f}°'.format(utc_datetime(tt), body, star, separation))
@@ -0,0 +1,221 @@
+''' The Yale Bright Star Catalog as a few NumPy arrays, observed all at once.
+
+    The catalog is built once from the original fixed-width file and saved
+    compactly in data/stars.npz:
+
+        python -m astro.stars build              # download and convert
+        python -m astro.stars build bsc5.dat.gz  # or from a local copy
+        python -m astro.stars --magnitude 4      # what's up right now
+
+    The copy shipped with the package was built from the named bright
+    stars of PyEphem's catalog (Hipparcos, J2000), in XEphem format, with
+    `python -m astro.stars build stars.edb`; building from BSC5 replaces it
+    with all 9,110 stars.
+
+    Every star goes into one array-valued `Star`, and the whole catalog is
+    reduced to altitude and azimuth in one pass of array arithmetic.
+'''
+import argparse
+import gzip
+import io
+import os
+import numpy as np
+from numpy import einsum
+from skyfield.constants import C_AUDAY, TAU
+from skyfield.earthlib import sidereal_time
+from skyfield.functions import spin_x, to_polar
+from skyfield.relativity import add_aberration
+from skyfield.starlib import Star
+from . import home, Position
+from .symbols import get_symbols
+
+CATALOG = os.path.join(os.path.dirname(__file__), 'data', 'stars.npz')
+URL = 'http://tdc-www.harvard.edu/catalogs/bsc5.dat.gz'
+
+# Where a database lists one star under several names, these are kept.
+PREFERRED_NAMES = {'Adhara', 'Albireo', 'Alkaid', 'Alpheratz', 'Eltanin', 'Fomalhaut', 'Gienah', 'Hadar'}
+
+
+def parse_bsc5(f):
+    ''' Harvard number, name, J2000 right ascension (hours), declination
+        (degrees) and visual magnitude of each entry in a binary BSC5 file.
+        A few entries, for objects no longer considered stars, have no
+        position and are skipped.
+    '''
+    hr, names, ra, dec, mag = [], [], [], [], []
+    for line in f:
+        line = line.decode('ascii')
+        if not line[75:77].strip() or not line[102:107].strip():
+            continue
+        number = int(line[0:4])
+        hr.append(number)
+        names.append(line[4:14].strip() or 'HR {}'.format(number))
+        ra.append(int(line[75:77]) + int(line[77:79]) / 60 + float(line[79:83]) / 3600)
+        sign = -1 if line[83] == '-' else 1
+        dec.append(sign * (int(line[84:86]) + int(line[86:88]) / 60 + int(line[88:90]) / 3600))
+        mag.append(float(line[102:107]))
+    return {
+        'hr': np.array(hr, dtype=np.int16),
+        'name': np.array(names),
+        'ra_hours': np.array(ra),
+        'dec_degrees': np.array(dec),
+        'magnitude': np.array(mag, dtype=np.float32),
+    }
+
+
+def parse_edb(f):
+    ''' The same arrays from fixed objects in an XEphem database, such as
+        PyEphem's bright stars. These have no Harvard numbers, so they are 0.
+        A star listed again under another name is only kept once.
+    '''
+    def sexagesimal(text):
+        parts = [float(x) for x in text.split('|')[0].split(':')]
+        sign = -1 if text.lstrip().startswith('-') else 1
+        return sign * sum(abs(x) / 60 ** i for i, x in enumerate(parts))
+
+    names, ra, dec, mag = [], [], [], []
+    seen = {}  # position -> index, as the same star can appear under other names
+    for line in f:
+        fields = line.decode('ascii').strip().split(',')
+        if len(fields) < 5 or not fields[1].startswith('f'):
+            continue
+        position = (sexagesimal(fields[2]), sexagesimal(fields[3]))
+        key = tuple(round(x, 4) for x in position)
+        if key in seen:
+            if fields[0] in PREFERRED_NAMES:
+                names[seen[key]] = fields[0]
+            continue
+        seen[key] = len(names)
+        names.append(fields[0])
+        ra.append(position[0])
+        dec.append(position[1])
+        mag.append(float(fields[4]))
+    return {
+        'hr': np.zeros(len(names), dtype=np.int16),
+        'name': np.array(names),
+        'ra_hours': np.array(ra),
+        'dec_degrees': np.array(dec),
+        'magnitude': np.array(mag, dtype=np.float32),
+    }
+
+
+def build_catalog(source=None, path=CATALOG):
+    ''' Convert a BSC5 file, downloading it if `source` is not given, or
+        an XEphem database if `source` ends in .edb.
+    '''
+    if source is None:
+        import requests
+        r = requests.get(URL)
+        r.raise_for_status()
+        f = gzip.GzipFile(fileobj=io.BytesIO(r.content))
+    elif source.endswith('.gz'):
+        f = gzip.open(source)
+    else:
+        f = open(source, 'rb')
+    with f:
+        catalog = parse_edb(f) if source is not None and source.endswith('.edb') else parse_bsc5(f)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    np.savez_compressed(path, **catalog)
+    return len(catalog['hr'])
+
+
+def horizon(jd, topos):
+    ''' The up, north and west unit vectors of `topos` in the equatorial
+        frame of date. These need sidereal time, and so nutation, which is
+        the slow part of `Apparent.altaz`; work them out once per time and
+        pass them to `altaz` for every body.
+    '''
+    spin = spin_x(-sidereal_time(jd, use_eqeq=True) * TAU / 24.0)
+    return [einsum('i,ij...->j...', v, spin) for v in (topos.up, topos.north, topos.west)]
+
+
+def altaz(p, axes):
+    ''' Altitude and azimuth in degrees of positions `p` in the equatorial
+        frame of date, shaped (3, ...) with time, if any, last.
+    '''
+    def component(v):
+        v = v.reshape(v.shape[:1] + (1,) * (p.ndim - v.ndim) + v.shape[1:])
+        return (v * p).sum(axis=0)
+    up, north, west = axes
+    _, alt, azi = to_polar(np.array([component(north), -component(west), component(up)]))
+    return np.degrees(alt), np.degrees(azi) % 360
+
+
+class StarCatalog:
+    ''' Many stars observed as one. `max_magnitude` drops the fainter ones
+        before anything is computed.
+    '''
+    def __init__(self, names, ra_hours, dec_degrees, magnitude, max_magnitude=None):
+        keep = slice(None) if max_magnitude is None else np.asarray(magnitude) <= max_magnitude
+        self.names = np.asarray(names)[keep]
+        self.magnitude = np.asarray(magnitude)[keep]
+        self.star = Star(ra_hours=np.asarray(ra_hours)[keep], dec_degrees=np.asarray(dec_degrees)[keep])
+
+    @classmethod
+    def load(cls, path=CATALOG, max_magnitude=6.5):
+        with np.load(path) as data:
+            return cls(data['name'], data['ra_hours'], data['dec_degrees'], data['magnitude'],
+                       max_magnitude)
+
+    def __len__(self):
+        return len(self.names)
+
+    def select(self, names):
+        'A catalog of just the stars called `names`, in that order.'
+        index = [self.names.tolist().index(name) for name in names]
+        return StarCatalog(self.names[index], self.star.ra._hours[index], self.star.dec._degrees[index],
+                           self.magnitude[index])
+
+    def apparent(self, jd, observer=home):
+        ''' The observer's position, and the apparent position of every star
+            in the equatorial frame of date, shaped (3, star) for a single
+            time or (3, star, time) for an array of times. skyfield's
+            `Star.observe_from` can only broadcast over times, not over
+            stars, so this does the same steps as `observe(star).apparent()`
+            for all of the stars at once.
+            Light deflection by the Sun is left out; it is a few
+            milliarcseconds except right next to the Sun.
+        '''
+        here = observer(jd)
+        stars = self.star._position_AU.reshape((3, -1) + (1,) * (here.position.AU.ndim - 1))
+        position = stars - here.position.AU[:, None]
+        lighttime = np.sqrt((position * position).sum(axis=0)) / C_AUDAY
+        add_aberration(position, here.velocity.AU_per_d[:, None], lighttime)
+        return here, einsum('ij...,jn...->in...', jd.M, position)
+
+    def radec(self, jd, observer=home):
+        'Apparent right ascension and declination of date, in radians, of every star.'
+        _, p = self.apparent(jd, observer)
+        _, dec, ra = to_polar(p)
+        return ra, dec
+
+    def altaz(self, jd, observer=home, axes=None):
+        ''' Altitude and azimuth in degrees of every star, shaped (star,) or
+            (star, time). `axes` are the observer's `horizon` at `jd` if
+            they are already known.
+        '''
+        here, p = self.apparent(jd, observer)
+        return altaz(p, axes if axes is not None else horizon(jd, here.topos))
+
+    def above_horizon(self, jd, observer=home, horizon=0.0):
+        'A `Position` for each star above the horizon, brightest first.'
+        alt, azi = self.altaz(jd, observer)
+        up = np.flatnonzero(alt > horizon)
+        up = up[np.argsort(self.magnitude[up])]
+        symbol = get_symbols()['BLACK STAR']
+        return [Position(str(self.names[i]), alt[i], azi[i], symbol) for i in up]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Bright stars above the horizon.')
+    parser.add_argument('command', nargs='?', choices=['build'])
+    parser.add_argument('source', nargs='?', help='local BSC5 (or XEphem .edb) file for build')
+    parser.add_argument('--magnitude', type=float, default=6.0, help='faintest to show')
+    args = parser.parse_args()
+    if args.command == 'build':
+        print(build_catalog(args.source), 'stars written to', CATALOG)
+    else:
+        from skyfield.timelib import now
+        catalog = StarCatalog.load(max_magnitude=args.magnitude)
+        for p in catalog.above_horizon(now()):
+            print('{0.symbol} {0.name:15s} {0.alt:3.0f}° at {0.azi:03.0f}°'.format(p))
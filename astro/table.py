@@ -1,55 +1,234 @@
 ''' Calculate a table with the position of the Sun every 4 minutes throughout the year.
     The Sun will move at most just less than one degree at my standard location, which
-    provides plenty of accuracy for my usual applications. Also, this can be used for
-    any year, results will be no different at degree accuracy.
+    provides plenty of accuracy for my usual applications. A table covers one year;
+    the Sun does not repeat closely enough from year to year to reuse it (0.4° off
+    after five years), so lookups outside it raise ValueError. Make a table for
+    another year with:
 
-    It takes about 88 seconds to generate this file.
+        python -m astro.table generate 2026
+
+    It takes about 88 seconds to generate this file on one core, so the
+    work is now split into chunks and spread across a process pool.
 
     Timing indicates that this isn't really all that fast, somewhat surprisingly.
     To be investigated...
+
+    The table is a small binary file: a header describing where and when it
+    starts, then packed int16 columns of altitude, azimuth and their rates of
+    change in fixed point. It is opened with mmap, so a lookup reads a few
+    values and never parses the whole file. Lookups interpolate between the
+    4-minute slots, with cubic Hermite by default, good to about 0.01°.
+    Nothing heavier than `struct` and `mmap` is imported for a lookup.
 '''
+import datetime
+import mmap
+import os
+import struct
 import time
-import json
-from skyfield.api import sun, JulianDate, now
-from . import home, timezone
+from . import LATITUDE, LONGITUDE, ELEVATION
+from . import timing
+
+STEP = 4  # minutes
+START = datetime.datetime(2015, 1, 1, 5, 0, tzinfo=datetime.timezone.utc)
+
+TABLE = os.path.join(os.path.dirname(__file__), 'data', 'sun.bin')
+MAGIC = b'ASUN'
+VERSION = 2
+# magic, version, start (Unix seconds), step (seconds), latitude, longitude,
+# elevation (meters), degrees per stored unit, degrees per step per stored
+# rate unit, number of entries.
+HEADER = struct.Struct('<4sHdIdddffI')
+VALUE = struct.Struct('<h')
+ALT, AZI, ALT_RATE, AZI_RATE = range(4)
+
+
+def compute_chunk(name, size, first, last, start=START):
+    ''' Fill slots [first, last) of the shared (2, size) float array `name`
+        with the altitude and azimuth of the Sun, slot 0 being at `start`.
+        Runs in a worker process,
+        and returns its stage timings along with the time taken.
+    '''
+    # Only needed here, so that importing the module for lookups stays quick.
+    from multiprocessing import shared_memory
+    import numpy as np
+    from skyfield.timelib import JulianDate
+    from . import home
+    from .ephemeris import load
+    starting = time.monotonic()
+    timings = timing.Timings()
+    sun = load()['sun']
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        out = np.ndarray((2, size), dtype=np.float64, buffer=shm.buf)
+        with timings.stage('timescale', 'Sun'):
+            jd = JulianDate(utc=(start.year, start.month, start.day, start.hour,
+                                 start.minute + np.arange(first, last) * STEP))
+        with timings.stage('home(jd)', 'Sun'):
+            here = home(jd)
+        with timings.stage('observe', 'Sun'):
+            position = here.observe(sun)
+        with timings.stage('apparent', 'Sun'):
+            position = position.apparent()
+        with timings.stage('altaz', 'Sun'):
+            altitude, azimuth, distance = position.altaz()
+        out[0, first:last] = altitude._degrees
+        out[1, first:last] = azimuth._degrees
+        del out
+    finally:
+        shm.close()
+    return first, last, time.monotonic() - starting, timings.as_records()
 
 
-def generate_tables():
+def generate_tables(chunks=None, workers=None, days=None, path=TABLE, start=START):
+    ''' The year is split into chunks of the 4-minute grid which are
+        computed across a process pool, each writing straight into one
+        shared output array. `start` picks the year, and by default the
+        table runs right through it, leap day included, to the slot at the
+        start of the next year so the last interval can be interpolated.
+        A shorter table, of `days`, is handy for benchmarks. Returns the
+        stage timings from all of the workers.
+    '''
+    from concurrent.futures import ProcessPoolExecutor
+    from multiprocessing import shared_memory
+    import numpy as np
+    timings = timing.Timings()
     starting = time.monotonic()
-    every_four_minutes = range(0, 365 * 1440, 4)
-    # We want to start at midnight local time in Columbus.
-    jd = JulianDate(utc=(2015, 1, 1, 5, every_four_minutes))
-    altitude, azimuth, distance = home(jd).observe(sun).apparent().altaz()
+    if days is None:
+        days = (start.replace(year=start.year + 1) - start).days
+    size = days * 1440 // STEP + 1
+    workers = workers or os.cpu_count() or 1
+    chunks = chunks or 4 * workers
+    bounds = np.linspace(0, size, chunks + 1).astype(int)
 
-    # Maybe should do this as a binary file, but loading this is pretty fast.
-    data = {
-        'alt': list(map(int, altitude._degrees)),
-        'azi': list(map(int, azimuth._degrees)),
-    }
+    shm = shared_memory.SharedMemory(create=True, size=2 * size * 8)
+    try:
+        with ProcessPoolExecutor(workers) as pool:
+            jobs = [pool.submit(compute_chunk, shm.name, size, first, last, start)
+                    for first, last in zip(bounds[:-1], bounds[1:]) if last > first]
+            for job in jobs:
+                first, last, seconds, records = job.result()
+                timings.merge(records)
+                print('Chunk {:6d}-{:6d}: {:6.2f} seconds'.format(first, last, seconds))
+        altitude, azimuth = np.ndarray((2, size), dtype=np.float64, buffer=shm.buf).copy()
+    finally:
+        shm.close()
+        shm.unlink()
 
-    with open('data/sun.json', 'wt') as f:
-        json.dump(data, f)
+    with timings.stage('formatting'):
+        write_table(path, start, STEP * 60, altitude, azimuth)
 
     print('Calculation time:', time.monotonic() - starting, 'seconds.')
+    return timings
 
 
-if __name__ == '__main__':
-    import pkgutil
+def write_table(path, start, step, altitude, azimuth, scale=0.01, rate_scale=0.001):
+    ''' Write altitude and azimuth arrays, in degrees, every `step` seconds
+        from `start`. Azimuths are stored in [-180, 180) so they fit an int16
+        at 0.01° resolution. Rates are degrees per step.
+    '''
+    import numpy as np
+    azimuth = np.asarray(azimuth) % 360
+    alt_rate = np.gradient(altitude)
+    azi_rate = np.degrees(np.gradient(np.unwrap(np.radians(azimuth))))
+    values = np.concatenate([
+        np.asarray(altitude) / scale,
+        np.where(azimuth < 180, azimuth, azimuth - 360) / scale,
+        alt_rate / rate_scale,
+        azi_rate / rate_scale,
+    ])
+    header = HEADER.pack(MAGIC, VERSION, start.timestamp(), step, LATITUDE, LONGITUDE,
+                         ELEVATION, scale, rate_scale, len(altitude))
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(header)
+        f.write(np.round(values).astype('<i2').tobytes())
+
+
+def hermite(f, v0, v1, m0, m1):
+    'Cubic Hermite interpolation at fraction `f` of one step.'
+    f2, f3 = f * f, f * f * f
+    h00, h10 = 2 * f3 - 3 * f2 + 1, f3 - 2 * f2 + f
+    h01, h11 = 3 * f2 - 2 * f3, f3 - f2
+    return h00 * v0 + h10 * m0 + h01 * v1 + h11 * m1
 
-    package_data = pkgutil.get_data(__package__, 'data/sun.json').decode('utf-8')
-    data = json.loads(package_data)
 
-    # The table of data for the Sun begins at midnight local time
-    # on January 1st and has data for every 4 minutes after that.
-    # Since it's in the Eastern time zone, that's 05:00 UTC.
-    # I could parameterize this better, and maybe I will someday. Otherwise it's
-    # easy to change for someplace else.
+class Table:
+    ''' A memory-mapped Sun table. Header fields are attributes. '''
+    def __init__(self, path=TABLE):
+        with open(path, 'rb') as f:
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, self.start, self.step, self.latitude, self.longitude,
+         self.elevation, self.scale, self.rate_scale, self.count) = HEADER.unpack_from(self.buffer)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('{} is not a version {} Sun table'.format(path, VERSION))
 
-    start = JulianDate(utc=(2015, 1, 1, 5, 0))
-    jd = now()
-    diff = (jd.utc_datetime() - start.utc_datetime()).total_seconds()
-    index = int(diff / 60 / 4)
-    alt, azi = data['alt'][index], data['azi'][index]
+    def value(self, column, index):
+        offset = HEADER.size + (column * self.count + index) * VALUE.size
+        scale = self.scale if column < ALT_RATE else self.rate_scale
+        return VALUE.unpack_from(self.buffer, offset)[0] * scale
 
-    print('Sun: {now:%A %d %B at %H:%M} {alt:3.0f}° high at {azi:03.0f}°'.format(
-        now=jd.utc_datetime().astimezone(timezone), alt=alt, azi=azi))
+    def index(self, dt):
+        ''' The slot at or before `dt` and how far `dt` is into it, as a
+            fraction of a step. ValueError if the table doesn't cover `dt`.
+        '''
+        i, f = divmod((dt.timestamp() - self.start) / self.step, 1)
+        if not 0 <= i < self.count - 1:
+            raise ValueError('{} is outside the Sun table'.format(dt))
+        return int(i), f
+
+    def lookup(self, dt, method='hermite'):
+        ''' Altitude and azimuth, in degrees, of the Sun at an aware datetime.
+            `method` is 'hermite', 'linear' or 'nearest' (the preceding slot).
+        '''
+        i, f = self.index(dt)
+        alt0, azi0 = self.value(ALT, i), self.value(AZI, i)
+        if method == 'nearest':
+            return alt0, azi0 % 360
+        j = i + 1
+        alt1 = self.value(ALT, j)
+        # Take the short way around when azimuth crosses north.
+        azi1 = azi0 + (self.value(AZI, j) - azi0 + 180) % 360 - 180
+        if method == 'linear':
+            alt = alt0 + f * (alt1 - alt0)
+            azi = azi0 + f * (azi1 - azi0)
+        elif method == 'hermite':
+            alt = hermite(f, alt0, alt1, self.value(ALT_RATE, i), self.value(ALT_RATE, j))
+            azi = hermite(f, azi0, azi1, self.value(AZI_RATE, i), self.value(AZI_RATE, j))
+        else:
+            raise ValueError('Unknown interpolation method: {}'.format(method))
+        return alt, azi % 360
+
+
+_table = None
+
+
+def lookup(dt, method='hermite'):
+    'Altitude and azimuth of the Sun at `dt` from the packaged table.'
+    global _table
+    if _table is None:
+        _table = Table()
+    return _table.lookup(dt, method)
+
+
+def year_start(year):
+    'Midnight local time in Columbus on January 1st, where a table for `year` starts.'
+    return START.replace(year=year)
+
+
+if __name__ == '__main__':
+    import argparse
+    from . import timezone
+    parser = argparse.ArgumentParser(description='The Sun from a precomputed table.')
+    parser.add_argument('command', nargs='?', choices=['generate'])
+    parser.add_argument('year', type=int, nargs='?', default=datetime.date.today().year)
+    args = parser.parse_args()
+    if args.command == 'generate':
+        print(generate_tables(start=year_start(args.year)).table())
+    else:
+        dt = datetime.datetime.now(datetime.timezone.utc)
+        try:
+            alt, azi = lookup(dt)
+        except (OSError, ValueError) as e:
+            parser.exit(1, '{}; run "python -m astro.table generate"\n'.format(e))
+        print('Sun: {now:%A %d %B at %H:%M} {alt:5.2f}° high at {azi:06.2f}°'.format(
+            now=dt.astimezone(timezone), alt=alt, azi=azi))
@@ -0,0 +1,73 @@
+''' Opt-in timing of the stages of a calculation, per body.
+
+        from astro import timing
+        timings = timing.enable()
+        ... run something ...
+        print(timings.table())
+
+    While timing is not enabled, `stage` costs next to nothing.
+'''
+import json
+import time
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+
+_timings = None
+_nothing = nullcontext()
+
+
+class Timings:
+    'Seconds spent in each (stage, body), over however many calls.'
+    def __init__(self):
+        self.records = defaultdict(list)
+
+    @contextmanager
+    def stage(self, name, body=''):
+        starting = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.records[name, body].append(time.perf_counter() - starting)
+
+    def merge(self, records):
+        'Add in records from elsewhere, such as `as_records` from another process.'
+        for name, body, seconds in records:
+            self.records[name, body].extend(seconds)
+
+    def as_records(self):
+        return [(name, body, seconds) for (name, body), seconds in self.records.items()]
+
+    def summary(self):
+        'Rows of stage, body, calls, total and mean seconds.'
+        return [(name, body, len(seconds), sum(seconds), sum(seconds) / len(seconds))
+                for (name, body), seconds in self.records.items()]
+
+    def table(self):
+        lines = ['{:12s} {:12s} {:>6s} {:>11s} {:>11s}'.format('stage', 'body', 'calls', 'total ms', 'mean ms')]
+        for name, body, calls, total, mean in self.summary():
+            lines.append('{:12s} {:12s} {:6d} {:11.3f} {:11.3f}'.format(
+                name, body, calls, total * 1000, mean * 1000))
+        return '\n'.join(lines)
+
+    def json(self):
+        keys = ('stage', 'body', 'calls', 'total', 'mean')
+        return json.dumps([dict(zip(keys, row)) for row in self.summary()], indent=2)
+
+
+def enable():
+    'Start recording, and return the `Timings` that will hold the results.'
+    global _timings
+    _timings = Timings()
+    return _timings
+
+
+def disable():
+    global _timings
+    _timings = None
+
+
+def stage(name, body=''):
+    'A context manager timing one stage, if timing is enabled.'
+    if _timings is None:
+        return _nothing
+    return _timings.stage(name, body)
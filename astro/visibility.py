@@ -0,0 +1,128 @@
+''' When is a body well placed in the morning or evening sky?
+
+    For every day in a range, the instants when the Sun reaches a chosen
+    twilight depth are found together, from the Sun's place on a daily grid
+    and the hour angle at which it reaches that altitude. Then each body is
+    observed at all of those instants in one call, and runs of days when it
+    is high enough become windows.
+
+    This replaces obsolete/astro/mercury.py, for any body and many years:
+
+        python -m astro.visibility 2015 2016 --body mercury --altitude 10
+'''
+import argparse
+from collections import namedtuple
+import numpy as np
+from skyfield.timelib import JulianDate
+from . import home
+from . import geometry
+from .ephemeris import apparent_sun, load
+from .events import SUN_HORIZON, TWILIGHT, year, utc_datetime
+
+# Sidereal days per solar day: turns hour angle into time.
+SIDEREAL_RATE = 1.00273790935
+
+Window = namedtuple('Window', 'name kind start end best alt')
+
+
+def sun_grid(start, end):
+    ''' Daily TT dates from `start` and the Sun's apparent right ascension
+        and declination of date, in radians, and TT - UT1 in days.
+    '''
+    t = np.arange(np.floor(start - 0.5) + 0.5, end + 2)
+    jd = JulianDate(tt=t)
+    ra, dec, _ = apparent_sun(load()['earth'](jd)).radec(epoch='date')
+    return t, np.unwrap(ra.radians), dec.radians, jd.tt - jd.ut1
+
+
+def twilight(start, end, sun_altitude=SUN_HORIZON, observer=home, iterations=3):
+    ''' TT dates of morning and evening, when the Sun is at `sun_altitude`
+        degrees, for each day from `start` to `end`. NaN on days when the
+        Sun does not get there.
+    '''
+    t, ra, dec, delta_t = sun_grid(start, end)
+    lat, lon = observer.latitude.radians, observer.longitude.radians
+    days = t[:-2] + 0.5 - lon / (2 * np.pi)  # local noon
+
+    def hour_angle(x):
+        'Hour angle of the Sun at TT dates `x`, and its hour angle at `sun_altitude`.'
+        d = np.interp(x, t, dec)
+        h = geometry.gmst(x - np.interp(x, t, delta_t)) + lon - np.interp(x, t, ra)
+        cos_h0 = (np.sin(np.radians(sun_altitude)) - np.sin(lat) * np.sin(d)) / (np.cos(lat) * np.cos(d))
+        with np.errstate(invalid='ignore'):
+            h0 = np.arccos(cos_h0)
+        return (h + np.pi) % (2 * np.pi) - np.pi, h0
+
+    found = []
+    for sign in (-1, 1):
+        x = days
+        for _ in range(iterations):
+            h, h0 = hour_angle(x)
+            x = x + (sign * h0 - h) / (2 * np.pi * SIDEREAL_RATE)
+        found.append(x)
+    morning, evening = found
+    keep = (days >= start) & (days < end)
+    return morning[keep], evening[keep]
+
+
+def altitudes(bodies, times, observer=home):
+    ''' Apparent altitude in degrees of each body at every one of `times`,
+        sharing one observer position. NaN times give NaN altitudes.
+    '''
+    times = np.asarray(times, dtype=float)
+    ok = np.isfinite(times)
+    here = observer(JulianDate(tt=times[ok]))
+    result = []
+    for body in bodies:
+        alt = np.full(times.shape, np.nan)
+        alt[ok] = here.observe(body).apparent().altaz()[0]._degrees
+        result.append(alt)
+    return result
+
+
+def windows(name, kind, times, alt, altitude):
+    'Runs of consecutive days when `alt` is at least `altitude`.'
+    with np.errstate(invalid='ignore'):
+        up = np.concatenate(([False], alt >= altitude, [False]))
+    edges = np.flatnonzero(np.diff(up.astype(np.int8)))
+    found = []
+    for first, last in zip(edges[::2], edges[1::2]):
+        best = first + np.argmax(alt[first:last])
+        found.append(Window(name, kind, times[first], times[last - 1], times[best], alt[best]))
+    return found
+
+
+def visibility(bodies, start, end, altitude=10.0, sun_altitude=SUN_HORIZON, observer=home):
+    ''' Windows between two TT dates when each of `bodies`, a dict of name
+        to anything skyfield can observe, is at least `altitude` degrees up
+        when the Sun is at `sun_altitude`, in the morning or the evening.
+    '''
+    morning, evening = twilight(start, end, sun_altitude, observer)
+    times = np.concatenate((morning, evening))
+    found = []
+    for name, alt in zip(bodies, altitudes(bodies.values(), times, observer)):
+        found += windows(name, 'morning', morning, alt[:len(morning)], altitude)
+        found += windows(name, 'evening', evening, alt[len(morning):], altitude)
+    found.sort(key=lambda w: (w.start, w.name))
+    return found
+
+
+if __name__ == '__main__':
+    from . import timezone
+    depths = {'sunrise': SUN_HORIZON}
+    depths.update((evening.split()[0], h) for h, morning, evening in TWILIGHT[1:])
+    parser = argparse.ArgumentParser(description='Morning and evening visibility of planets.')
+    parser.add_argument('first', type=int)
+    parser.add_argument('last', type=int, nargs='?')
+    parser.add_argument('--body', action='append', required=True,
+                        help='a planet, by skyfield name, e.g. mercury; may be repeated')
+    parser.add_argument('--altitude', type=float, default=10.0, help='degrees above the horizon')
+    parser.add_argument('--twilight', choices=list(depths), default='sunrise')
+    args = parser.parse_args()
+    planets = {planet.jplname: planet for planet in load()['nine_planets']}
+    bodies = {name.capitalize(): planets[name.lower()] for name in args.body}
+    start, end = year(args.first)[0], year(args.last or args.first)[1]
+    for w in visibility(bodies, start, end, args.altitude, depths[args.twilight]):
+        print('{:10s} {:7s} {:%Y-%m-%d} to {:%Y-%m-%d}, best {:%Y-%m-%d} at {:4.1f}°'.format(
+            w.name, w.kind, utc_datetime(w.start).astimezone(timezone),
+            utc_datetime(w.end).astimezone(timezone), utc_datetime(w.best).astimezone(timezone), w.alt))
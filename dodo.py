@@ -5,7 +5,16 @@ def task_satellites():
     'Periodically retrieve the most recent satellite elements.'
     return {
         'actions': ['python -m astro.satellites --retrieve'],
-        'uptodate': [timeout(datetime.timedelta(days=3))],
+        'uptodate': [timeout(datetime.timedelta(hours=6))],
         'clean': True,
         'file_dep': ['visual.txt'],
     }
+
+
+def task_stars():
+    'Build the compact bright-star catalog from the Yale Bright Star Catalog.'
+    return {
+        'actions': ['python -m astro.stars build'],
+        'targets': ['astro/data/stars.npz'],
+        'uptodate': [True],
+    }
@@ -10,12 +10,13 @@ setup(
     url = 'https://github.com/mhsundstrom/astro',
     packages = ['astro'],
     include_package_data=False,
-    requires=['skyfield'],
+    package_data={'astro': ['data/stars.npz']},
+    requires=['skyfield', 'sgp4', 'numpy', 'scipy'],
     zip_safe=False,
     scripts = [],
     entry_points={
         'console_scripts': [
-            ',astro=astro.__main__:current',
+            ',astro=astro.__main__:main',
         ],
     },
 )
@@ -0,0 +1,90 @@
+''' Conditional, atomic retrieval of two-line elements, against a stand-in
+    HTTP server on localhost.
+'''
+import http.server
+import os
+import threading
+import pytest
+from astro import satellites
+
+ISS = '''ISS (ZARYA)
+1 25544U 98067A   15180.54791667  .00016717  00000-0  10270-3 0  9008
+2 25544  51.6416 247.4627 0006703 130.5360 325.0288 15.72125391563538
+'''
+ETAG = '"one"'
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    'Serves `self.server.body`, honouring If-None-Match.'
+    def do_GET(self):
+        if self.headers.get('If-None-Match') == self.server.etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('ETag', self.server.etag)
+        self.send_header('Content-Length', str(len(self.server.body)))
+        self.end_headers()
+        self.wfile.write(self.server.body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = http.server.HTTPServer(('127.0.0.1', 0), Handler)
+    httpd.body, httpd.etag = ISS.encode('ascii'), ETAG
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def url(httpd):
+    return 'http://127.0.0.1:{}/visual.txt'.format(httpd.server_port)
+
+
+def test_first_download(server, tmp_path):
+    filename = str(tmp_path / 'visual.txt')
+    assert satellites.retrieve(url(server), filename) == {'ISS (ZARYA)': (None, '15180.54791667')}
+    with open(filename) as f:
+        assert f.read() == ISS
+    assert os.path.exists(filename + '.changes.log')
+
+
+def test_not_modified(server, tmp_path):
+    filename = str(tmp_path / 'visual.txt')
+    satellites.retrieve(url(server), filename)
+    before = os.stat(filename).st_mtime_ns
+    assert satellites.retrieve(url(server), filename) == {}
+    assert os.stat(filename).st_mtime_ns == before
+
+
+def test_changed_epoch_is_logged(server, tmp_path):
+    filename = str(tmp_path / 'visual.txt')
+    satellites.retrieve(url(server), filename)
+    server.body = ISS.replace('15180.54791667', '15181.12345678').encode('ascii')
+    server.etag = '"two"'
+    changes = satellites.retrieve(url(server), filename)
+    assert changes == {'ISS (ZARYA)': ('15180.54791667', '15181.12345678')}
+    with open(filename + '.changes.log') as f:
+        assert f.readlines()[-1].endswith('ISS (ZARYA) 15180.54791667 -> 15181.12345678\n')
+    assert satellites.epochs(filename) == {'ISS (ZARYA)': '15181.12345678'}
+
+
+@pytest.mark.parametrize('body', [
+    b'<html><body>Service unavailable</body></html>\n',
+    b'\xff\xfe not elements\n',
+    ISS.replace('\n2 ', '\n3 ').encode('ascii'),
+])
+def test_bad_body_is_refused(server, tmp_path, body):
+    filename = str(tmp_path / 'visual.txt')
+    satellites.retrieve(url(server), filename)
+    server.body, server.etag = body, '"bad"'
+    with pytest.raises(ValueError, match='not two-line elements'):
+        satellites.retrieve(url(server), filename)
+    assert sorted(os.listdir(tmp_path)) == ['visual.txt', 'visual.txt.changes.log', 'visual.txt.http.json']
+    with open(filename) as f:
+        assert f.read() == ISS